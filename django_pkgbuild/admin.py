@@ -2,7 +2,8 @@ from django import forms
 from django.contrib import admin
 from django.db.models import Q
 
-from .models import Architecture, BasePackage, Package, Build, Repository
+from .models import Architecture, BasePackage, Batch, Chroot, Package, Build, BuildPhase, DatabaseUpdate, Event, Job, \
+    Metric, Publication, Refresh, RefreshRequest, Repository
 
 
 class RepositoryForm(forms.ModelForm):
@@ -28,3 +29,13 @@ admin.site.register(Architecture)
 admin.site.register(BasePackage)
 admin.site.register(Package)
 admin.site.register(Build)
+admin.site.register(BuildPhase)
+admin.site.register(Refresh)
+admin.site.register(RefreshRequest)
+admin.site.register(Batch)
+admin.site.register(Chroot)
+admin.site.register(Job)
+admin.site.register(Publication)
+admin.site.register(DatabaseUpdate)
+admin.site.register(Metric)
+admin.site.register(Event)
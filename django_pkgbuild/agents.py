@@ -0,0 +1,332 @@
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import socketserver
+import struct
+import tarfile
+import threading
+import time
+from pathlib import Path
+
+from .phases import run_timed
+
+logger = logging.getLogger(__name__)
+
+# Hosts TCP coordinators may listen on without a shared secret
+LOCALHOST = ('localhost', '127.0.0.1', '::1')
+# Every frame is a JSON message followed by an optional binary payload, both prefixed with their length
+HEADER = struct.Struct('!II')
+# Files of a PKGBUILD directory which are never sent to agents
+SKIPPED = ('src', 'pkg', '.git')
+SKIPPED_SUFFIXES = ('.pkg.tar.xz', '.pkg.tar.xz.sig', '.log')
+# Rewritten by the pkgver() function of VCS packages, the local copy is parsed for the new version
+UPDATED = ('PKGBUILD', '.SRCINFO')
+
+
+def send(sock, message, payload=b''):
+    """Send a message along with a binary payload."""
+    data = json.dumps(message).encode()
+    sock.sendall(HEADER.pack(len(data), len(payload)) + data + payload)
+
+
+def receive_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def receive(sock):
+    """Returns the next message and its payload."""
+    size, payload_size = HEADER.unpack(receive_exactly(sock, HEADER.size))
+    return json.loads(receive_exactly(sock, size).decode()), receive_exactly(sock, payload_size)
+
+
+def parse_address(address):
+    """Returns the socket family and address of unix:/path or host:port."""
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return socket.AF_INET, (host or 'localhost', int(port))
+
+
+def sign(secret, nonce):
+    """Returns the answer to a coordinator challenge, proving the knowledge of the shared secret."""
+    return hmac.new((secret or '').encode(), bytes.fromhex(nonce), hashlib.sha256).hexdigest()
+
+
+def connect(address, secret=None):
+    """Returns a socket connected to a coordinator, having answered its challenge."""
+    family, address = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(address)
+    challenge = receive(sock)[0]
+    send(sock, {'type': 'auth', 'digest': sign(secret, challenge['nonce'])})
+    return sock
+
+
+def pack_build(directory, depends):
+    """Returns a tar archive of the files needed to build a PKGBUILD, with dependency packages in deps."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for entry in os.scandir(directory):
+            if entry.name not in SKIPPED and not entry.name.endswith(SKIPPED_SUFFIXES):
+                archive.add(entry.path, arcname=entry.name)
+        for path in depends:
+            archive.add(str(path), arcname=f'deps/{Path(path).name}')
+    return buffer.getvalue()
+
+
+def run_remote(address, chbuild, architecture, pkgbase, directory, depends, log, secret=None):
+    """Build a PKGBUILD on an agent, writing its log and artifacts locally, and return its status and phases.
+
+    Artifacts include the PKGBUILD when the build updated its version. An unreachable coordinator, or one going away,
+    fails the build.
+    """
+    try:
+        with connect(address, secret) as sock:
+            send(sock, {'type': 'submit', 'chbuild': chbuild, 'architecture': architecture, 'pkgbase': pkgbase,
+                        'depends': [Path(path).name for path in depends]}, pack_build(directory, depends))
+            while True:
+                message, payload = receive(sock)
+                if message['type'] == 'log':
+                    log.write(payload)
+                    log.flush()
+                elif message['type'] == 'artifact':
+                    (Path(directory) / Path(message['name']).name).write_bytes(payload)
+                elif message['type'] == 'result':
+                    return message['status'], message['durations']
+    except OSError as e:
+        log.write(f'==> ERROR: Lost the build coordinator at {address}: {e}\n'.encode())
+        return 1, {}
+
+
+class Request:
+    def __init__(self, sock, message, payload):
+        self.sock = sock
+        self.message = message
+        self.payload = payload
+        self.submitted = time.monotonic()
+        self.done = threading.Event()
+
+
+class Coordinator:
+    """Hands builds submitted by Django Q workers to the agents pulling them.
+
+    Each agent connection is a build slot. A build goes to an idle slot of the right chroot target, preferably one of
+    an agent which already built the package and thus has its sources and chroot packages cached. Builds which are
+    warm on a busy agent wait up to warm_wait seconds for it before going to another one.
+
+    Agents and workers build and publish whatever they send, so every connection must answer a challenge with the
+    shared secret, when there is one.
+    """
+
+    def __init__(self, warm_wait=30, secret=None):
+        self.warm_wait = warm_wait
+        self.secret = secret
+        self.condition = threading.Condition()
+        self.requests = []
+        # Packages built by each agent, shared by its slots
+        self.warm = {}
+        self.capacity = {}
+
+    def submit(self, request):
+        with self.condition:
+            self.requests.append(request)
+            self.condition.notify_all()
+
+    def warm_elsewhere(self, request, name):
+        return any(request.message['pkgbase'] in warm for agent, warm in self.warm.items() if agent != name)
+
+    def pick(self, name, targets):
+        """Returns the request an agent slot should build next, if any."""
+        candidates = [request for request in self.requests if request.message['chbuild'] in targets]
+        for request in candidates:
+            if request.message['pkgbase'] in self.warm[name]:
+                return request
+        now = time.monotonic()
+        for request in candidates:
+            if not self.warm_elsewhere(request, name) or now - request.submitted > self.warm_wait:
+                return request
+        return None
+
+    def next_request(self, name, targets):
+        with self.condition:
+            while True:
+                request = self.pick(name, targets)
+                if request:
+                    self.requests.remove(request)
+                    return request
+                # Wake up regularly, warm builds may have waited long enough
+                self.condition.wait(timeout=1)
+
+    def serve_agent(self, sock, hello):
+        name = hello['name']
+        with self.condition:
+            self.warm.setdefault(name, set()).update(hello.get('warm', []))
+            self.capacity[name] = self.capacity.get(name, 0) + 1
+        logger.info('Agent %s connected for %s', name, ', '.join(hello['targets']))
+        try:
+            while True:
+                message, payload = receive(sock)
+                if message['type'] != 'ready':
+                    continue
+                request = self.next_request(name, hello['targets'])
+                try:
+                    self.relay(sock, request)
+                except (OSError, ValueError):
+                    try:
+                        send(request.sock, {'type': 'result', 'status': 255, 'durations': {},
+                                            'error': f'Agent {name} was lost'})
+                    except OSError:
+                        pass
+                    raise
+                finally:
+                    request.done.set()
+                with self.condition:
+                    self.warm[name].add(request.message['pkgbase'])
+        except (OSError, ValueError):
+            logger.warning('Agent %s disconnected', name)
+        finally:
+            with self.condition:
+                self.capacity[name] -= 1
+
+    def relay(self, sock, request):
+        """Send a build to an agent and forward its log, artifacts and result to the worker which submitted it.
+
+        Only errors on the agent side are raised. If the worker went away, the rest of the build is drained so that the
+        agent stays usable.
+        """
+        send(sock, {**request.message, 'type': 'build'}, request.payload)
+        worker = True
+        while True:
+            message, payload = receive(sock)
+            if worker:
+                try:
+                    send(request.sock, message, payload)
+                except OSError:
+                    logger.warning('Worker building %s went away', request.message['pkgbase'])
+                    worker = False
+            if message['type'] == 'result':
+                return
+
+    def authenticate(self, sock):
+        """Returns True if the peer answered the challenge with the shared secret, or if there is none."""
+        nonce = os.urandom(16).hex()
+        send(sock, {'type': 'challenge', 'nonce': nonce})
+        message = receive(sock)[0]
+        if self.secret is None:
+            return True
+        return message['type'] == 'auth' and hmac.compare_digest(message['digest'], sign(self.secret, nonce))
+
+    def handle(self, sock):
+        if not self.authenticate(sock):
+            logger.warning('Rejected a connection which failed to authenticate')
+            return
+        message, payload = receive(sock)
+        if message['type'] == 'hello':
+            self.serve_agent(sock, message)
+        elif message['type'] == 'submit':
+            request = Request(sock, message, payload)
+            self.submit(request)
+            request.done.wait()
+        elif message['type'] == 'status':
+            with self.condition:
+                send(sock, {'type': 'status', 'capacity': self.capacity, 'queued': len(self.requests)})
+
+    def server(self, address):
+        """Returns a server accepting agents and workers on address."""
+        coordinator = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                coordinator.handle(self.request)
+
+        family, address = parse_address(address)
+        if family != socket.AF_UNIX and self.secret is None and address[0] not in LOCALHOST:
+            raise ValueError('A shared secret is required to listen on other hosts than localhost')
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.unlink(address)
+            server = socketserver.ThreadingUnixStreamServer(address, Handler)
+        else:
+            server = socketserver.ThreadingTCPServer(address, Handler)
+        server.daemon_threads = True
+        return server
+
+
+class LogWriter:
+    """File-like object sending build output to the coordinator."""
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, data):
+        send(self.sock, {'type': 'log'}, data)
+
+    def flush(self):
+        pass
+
+
+class Agent:
+    """One build slot of a build host, pulling builds from a coordinator."""
+
+    def __init__(self, address, name, architectures, targets, workdir, command=('sudo',), secret=None):
+        self.address = address
+        self.secret = secret
+        self.name = name
+        self.architectures = architectures
+        self.targets = targets
+        self.workdir = Path(workdir)
+        self.command = list(command)
+
+    def warm(self):
+        """Returns the packages whose build directory, and thus sources, are still around."""
+        return [entry.name for entry in os.scandir(self.workdir) if entry.is_dir()]
+
+    def build(self, sock, message, payload):
+        # Slots of an agent may build a package for several targets at once
+        directory = self.workdir / message['pkgbase'] / message['chbuild']
+        deps = directory / 'deps'
+        if deps.exists():
+            shutil.rmtree(str(deps))
+        directory.mkdir(parents=True, exist_ok=True)
+        with tarfile.open(fileobj=io.BytesIO(payload)) as archive:
+            archive.extractall(str(directory))
+        cmd = [*self.command, message['chbuild']]
+        if message['depends']:
+            cmd.append('--')
+            for filename in message['depends']:
+                cmd += ['-I', str(deps / filename)]
+        start = time.time()
+        status, durations = run_timed(cmd, directory, LogWriter(sock))
+        for entry in os.scandir(directory):
+            if entry.stat().st_mtime < int(start):
+                continue
+            if entry.name.endswith(SKIPPED_SUFFIXES[:2]):
+                send(sock, {'type': 'artifact', 'name': entry.name}, Path(entry.path).read_bytes())
+                os.unlink(entry.path)
+            elif entry.name in UPDATED:
+                send(sock, {'type': 'artifact', 'name': entry.name}, Path(entry.path).read_bytes())
+        send(sock, {'type': 'result', 'status': status, 'durations': durations})
+
+    def run(self):
+        """Build what the coordinator sends until the connection is closed."""
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        with connect(self.address, self.secret) as sock:
+            send(sock, {'type': 'hello', 'name': self.name, 'architectures': self.architectures,
+                        'targets': self.targets, 'warm': self.warm()})
+            while True:
+                send(sock, {'type': 'ready'})
+                message, payload = receive(sock)
+                if message['type'] == 'build':
+                    self.build(sock, message, payload)
@@ -0,0 +1,136 @@
+import errno
+import fcntl
+import logging
+import os
+import shutil
+
+from django.conf import settings
+
+from .models import BasePackage, Build, DatabaseUpdate, Repository
+
+logger = logging.getLogger(__name__)
+
+# From linux/fs.h
+FICLONE = 0x40049409
+EXTENSIONS = ('.pkg.tar.xz', '.pkg.tar.xz.sig')
+
+
+def reflink(source, destination):
+    """Clone source to destination on filesystems sharing extents, like btrfs and XFS."""
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(destination)
+            raise
+
+
+def link_file(source, destination):
+    """Hardlink a file, or reflink it, or copy it when neither is possible, and return the method used."""
+    try:
+        os.link(source, destination)
+        return 'hardlink'
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+    try:
+        reflink(source, destination)
+        return 'reflink'
+    except OSError:
+        shutil.copy(source, destination)
+        return 'copy'
+
+
+def publish_file(source, directory):
+    """Link a file into directory like link_file, replacing the previous one atomically, and return the method used.
+
+    devtools moves new packages over old ones rather than writing them in place, so published links stay intact.
+    """
+    destination = directory / source.name
+    if destination.exists() and destination.samefile(source):
+        # Already published, and rename() does nothing between two links to the same file
+        return 'hardlink'
+    # Dot files are never parsed as packages, so pruning leaves the ones of concurrent publications alone
+    temporary = directory / f'.{source.name}.{os.getpid()}'
+    if temporary.exists():
+        temporary.unlink()
+    try:
+        method = link_file(source, temporary)
+        os.replace(temporary, destination)
+    except OSError:
+        if temporary.exists():
+            temporary.unlink()
+        raise
+    return method
+
+
+def parse_filename(filename, names):
+    """Returns the package name and version of a package file, or None if it is not a file of one of names."""
+    for extension in EXTENSIONS:
+        if filename.endswith(extension):
+            stem = filename[:-len(extension)]
+            break
+    else:
+        return None
+    # pkgver and pkgrel cannot contain dashes, so the version is made of the two fields before the architecture
+    parts = stem.rsplit('-', maxsplit=3)
+    if len(parts) != 4 or parts[0] not in names:
+        return None
+    return parts[0], f'{parts[1]}-{parts[2]}'
+
+
+def remove_file(path):
+    """Remove a file and return the bytes freed, which is 0 while other links to it remain."""
+    stat = path.stat()
+    path.unlink()
+    return stat.st_size if stat.st_nlink == 1 else 0
+
+
+def retained_versions(base_package, keep):
+    """Returns the current version of a base package and the versions of its latest keep successful builds."""
+    built = []
+    for version in Build.objects.filter(base_package=base_package, status=0).order_by('-id') \
+            .values_list('version', flat=True):
+        if len(built) == keep:
+            break
+        if version not in built:
+            built.append(version)
+    return {base_package.version, *built}
+
+
+def prune_directory(directory, versions, pending):
+    """Remove the package files of directory whose version is not retained, and return the bytes freed."""
+    freed = 0
+    if not directory.is_dir():
+        return freed
+    for entry in os.scandir(directory):
+        parsed = parse_filename(entry.name, versions)
+        package_file = entry.name[:-len('.sig')] if entry.name.endswith('.sig') else entry.name
+        if parsed and parsed[1] not in versions[parsed[0]] and package_file not in pending:
+            freed += remove_file(directory / entry.name)
+    return freed
+
+
+def prune_artifacts(keep=None):
+    """Remove superseded package files and builds, keeping the latest keep versions of each package.
+
+    Returns the number of bytes freed.
+    """
+    if keep is None:
+        keep = settings.PKGBUILD.get('retention', 1)
+    # Files which repo-add has yet to see
+    pending = set(DatabaseUpdate.objects.filter(action=DatabaseUpdate.ADD).values_list('filename', flat=True))
+    versions = {}
+    freed = 0
+    for base_pkg in BasePackage.objects.prefetch_related('packages'):
+        retained = retained_versions(base_pkg, keep)
+        names = {pkg.name: retained for pkg in base_pkg.packages.all() if not pkg.virtual}
+        versions.update(names)
+        freed += prune_directory(base_pkg.directory(), names, pending)
+        Build.objects.filter(base_package=base_pkg).exclude(version__in=retained).delete()
+    for repo in Repository.objects.prefetch_related('architectures'):
+        for arch in repo.architectures.all():
+            freed += prune_directory(repo.directory(arch), versions, pending)
+    logger.info('Pruned superseded packages, freeing %d bytes', freed)
+    return freed
@@ -0,0 +1,181 @@
+import platform
+import random
+import time
+from collections import deque
+from contextlib import ExitStack
+from pathlib import Path
+from unittest import mock
+
+import django
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+PKGBUILD = '''pkgbase={pkgbase}
+pkgname=({pkgnames})
+pkgver=1.0.0
+pkgrel={pkgrel}
+pkgdesc='Benchmark package'
+arch=('x86_64')
+license=('GPL')
+depends=({depends})
+makedepends=({makedepends})
+provides=({provides})
+
+package() {{
+    return 0
+}}
+'''
+
+
+class QueryCounter(CaptureQueriesContext):
+    """Counts queries, without the 9000 query limit of the connection log."""
+
+    def __enter__(self):
+        self.queries_log = self.connection.queries_log
+        self.connection.queries_log = deque()
+        return super().__enter__()
+
+    def __exit__(self, *args):
+        super().__exit__(*args)
+        self.count = self.final_queries - self.initial_queries
+        self.connection.queries_log = self.queries_log
+
+
+def package_name(index):
+    """Returns the name of a synthetic base package."""
+    return f'bench-{index:05d}'
+
+
+def package_directory(root, index, official=0.2, grouped=0.2):
+    """Returns the directory holding the PKGBUILD of a synthetic package, in one of the supported layouts."""
+    name = package_name(index)
+    # Spread layouts evenly rather than randomly, so that a given index always has the same layout
+    slot = index % 10
+    if slot < official * 10:
+        return root / name / 'trunk'
+    if slot < (official + grouped) * 10:
+        return root / f'group-{index % 7}' / name
+    return root / name
+
+
+def write_package(directory, pkgbase, pkgnames, depends, makedepends, provides, pkgrel=1):
+    """Write a PKGBUILD along with an up to date .SRCINFO, so that mksrcinfo never runs."""
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / 'PKGBUILD').write_text(PKGBUILD.format(
+        pkgbase=pkgbase, pkgnames=' '.join(pkgnames), pkgrel=pkgrel, depends=' '.join(depends),
+        makedepends=' '.join(makedepends), provides=' '.join(provides)))
+    lines = [f'pkgbase = {pkgbase}', '\tpkgdesc = Benchmark package', '\tpkgver = 1.0.0', f'\tpkgrel = {pkgrel}',
+             '\tarch = x86_64', '\tlicense = GPL']
+    lines += [f'\tmakedepends = {dep}' for dep in makedepends]
+    lines += [f'\tdepends = {dep}' for dep in depends]
+    lines += [f'\tprovides = {virtual}' for virtual in provides]
+    for name in pkgnames:
+        lines += ['', f'pkgname = {name}']
+    (directory / '.SRCINFO').write_text('\n'.join(lines) + '\n')
+
+
+def generate_tree(root, count, chain=100, split=0.1, provides=0.05, seed=0):
+    """Generate count synthetic base packages in root and return the names of the last package of each chain.
+
+    Each package depends on the previous one of its chain, and some also build depend on a random earlier package,
+    either directly or through a virtual package.
+    """
+    root = Path(root)
+    rng = random.Random(seed)
+    providers = []
+    tips = []
+    for index in range(count):
+        name = package_name(index)
+        pkgnames = [name, f'{name}-libs'] if rng.random() < split else [name]
+        virtuals = [f'virtual-{index:05d}'] if rng.random() < provides else []
+        depends = [package_name(index - 1)] if index % chain else []
+        makedepends = []
+        if index and rng.random() < 0.2:
+            if providers and rng.random() < 0.5:
+                makedepends.append(rng.choice(providers))
+            else:
+                makedepends.append(package_name(rng.randrange(index)))
+        write_package(package_directory(root, index), name, pkgnames, depends, makedepends, virtuals)
+        providers.extend(virtuals)
+        if index % chain == chain - 1 or index == count - 1:
+            tips.append(name)
+    return tips
+
+
+def touch_package(root, index):
+    """Bump the pkgrel of a synthetic package, as a commit to the tree would."""
+    directory = package_directory(Path(root), index)
+    for name, old, new in (('PKGBUILD', 'pkgrel=1', 'pkgrel=2'), ('.SRCINFO', 'pkgrel = 1', 'pkgrel = 2')):
+        path = directory / name
+        path.write_text(path.read_text().replace(old, new))
+
+
+def stub_tools():
+    """Returns a context manager replacing the devtools and Django Q, so that benchmarks never leave the process."""
+    stack = ExitStack()
+
+    def generate_srcinfo(directory):
+        raise RuntimeError(f'Stale .SRCINFO in {directory}')
+
+    stack.enter_context(mock.patch('django_pkgbuild.srcinfo.generate_srcinfo', generate_srcinfo))
+    stack.enter_context(mock.patch('django_pkgbuild.tasks.run_timed', return_value=(0, {})))
+    stack.enter_context(mock.patch('django_pkgbuild.scheduler.dispatch'))
+    return stack
+
+
+def measure(name, count, func, *args, **kwargs):
+    """Returns the duration and number of queries of a call."""
+    with QueryCounter(connection) as queries:
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    return {'name': name, 'packages': count, 'seconds': round(seconds, 4), 'queries': queries.count}
+
+
+def run(root, count, chain=100):
+    """Run every benchmark against a tree of count packages and return the results.
+
+    Database changes are rolled back, so that sizes can be benchmarked one after the other.
+    """
+    from .models import BasePackage, Package, Repository
+    from .tasks import parse_srcinfo, refresh_packages
+    from .views import index
+
+    tips = generate_tree(root, count, chain)
+
+    def parse_all():
+        for base_pkg in BasePackage.objects.all():
+            parse_srcinfo(base_pkg)
+
+    def render_index():
+        index(RequestFactory().get('/')).content
+
+    results = []
+    with transaction.atomic():
+        results.append(measure('refresh_full', count, refresh_packages, full=True))
+        results.append(measure('refresh_unchanged', count, refresh_packages))
+        touch_package(root, count // 2)
+        results.append(measure('refresh_changed', count, refresh_packages))
+        results.append(measure('parse_srcinfo', count, parse_all))
+        repo = Repository.objects.create(name='bench', description='Benchmark', target=Repository.EXTRA)
+        repo.architectures.add(*BasePackage.objects.first().architectures.all())
+        results.append(measure('add_package_to_repo', count, repo.packages.add,
+                               *Package.objects.filter(name__in=tips)))
+        results.append(measure('index', count, render_index))
+        transaction.set_rollback(True)
+    return results
+
+
+def report(sizes, results):
+    """Returns the results along with what is needed to compare runs."""
+    return {'date': timezone.now().isoformat(), 'sizes': sizes, 'python': platform.python_version(),
+            'django': django.get_version(), 'database': connection.vendor, 'results': results}
+
+
+def compare(results, previous):
+    """Yields each result along with its previous duration and query count, if any."""
+    previous = {(result['name'], result['packages']): result for result in previous['results']}
+    for result in results:
+        yield result, previous.get((result['name'], result['packages']))
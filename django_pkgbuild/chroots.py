@@ -0,0 +1,109 @@
+import subprocess
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Chroot
+from .phases import run_timed
+
+DEVTOOLS = Path('/usr/share/devtools')
+# Chroots still being prepared after this long are assumed abandoned by a killed worker, and prepared again
+PREPARE_TIMEOUT = timedelta(hours=1)
+
+
+def parse_target(chbuild):
+    """Returns the repository and architecture of an archbuild target, like extra-x86_64-build or multilib-build."""
+    name = chbuild[:-len('-build')]
+    if name.startswith('multilib'):
+        return name, 'x86_64'
+    repo, arch = name.rsplit('-', maxsplit=1)
+    return repo, arch
+
+
+def chroot_directory(chbuild):
+    """Returns the directory holding the root chroot of a target and its copies, the same one archbuild uses."""
+    repo, arch = parse_target(chbuild)
+    return Path(settings.PKGBUILD.get('chroots_root', '/var/lib/archbuild')) / f'{repo}-{arch}'
+
+
+def config_args(chbuild):
+    repo, arch = parse_target(chbuild)
+    return ['-C', str(DEVTOOLS / f'pacman-{repo}.conf'), '-M', str(DEVTOOLS / f'makepkg-{arch}.conf')]
+
+
+def create_command(chbuild):
+    """Returns the command creating the root chroot of a target."""
+    packages = ['base-devel', 'multilib-devel'] if chbuild.startswith('multilib') else ['base-devel']
+    return ['sudo', 'mkarchroot', *config_args(chbuild), str(chroot_directory(chbuild) / 'root'), *packages]
+
+
+def update_command(chbuild):
+    """Returns the command updating the root chroot of a target."""
+    return ['sudo', 'arch-nspawn', *config_args(chbuild), str(chroot_directory(chbuild) / 'root'),
+            'pacman', '-Syuu', '--noconfirm']
+
+
+def build_command(chbuild, copy, install_args):
+    """Returns the makechrootpkg command building in a fresh copy of the root chroot, without updating it.
+
+    The copy is cleaned before building, like archbuild does, and namcap is left to the packagers as with archbuild.
+    """
+    return ['sudo', 'makechrootpkg', '-c', '-r', str(chroot_directory(chbuild)), '-l', copy, *install_args]
+
+
+def prepare_chroot(batch_id, chbuild, log):
+    """Create or update the root chroot of a target once per batch, and return True if it is ready.
+
+    The first build of a batch for a target prepares it, writing to its log, while the others wait for it, up to
+    PREPARE_TIMEOUT.
+    """
+    chroot, claimed = Chroot.objects.get_or_create(batch_id=batch_id, target=chbuild)
+    while not claimed and chroot.state == Chroot.PREPARING:
+        time.sleep(1)
+        chroot.refresh_from_db()
+        if chroot.state == Chroot.PREPARING:
+            claimed = Chroot.objects.filter(id=chroot.id, state=Chroot.PREPARING,
+                                            updated__lt=timezone.now() - PREPARE_TIMEOUT) \
+                .update(updated=timezone.now()) == 1
+    if claimed:
+        directory = chroot_directory(chbuild)
+        if (directory / 'root').is_dir():
+            status, durations = run_timed(update_command(chbuild), '/', log)
+        else:
+            subprocess.run(['sudo', 'install', '-d', str(directory)])
+            status, durations = run_timed(create_command(chbuild), '/', log)
+        chroot.state = Chroot.FAILED if status else Chroot.READY
+        chroot.save()
+    return chroot.state == Chroot.READY
+
+
+def is_subvolume(path):
+    """Returns True if path is a btrfs subvolume, which makechrootpkg snapshots the root chroot as."""
+    proc = subprocess.run(['stat', '-f', '-c', '%T', str(path)], stdout=subprocess.PIPE, universal_newlines=True)
+    return proc.stdout.strip() == 'btrfs' and path.stat().st_ino == 256
+
+
+def remove_copy(path):
+    """Delete a copy of a root chroot, along with its lock file."""
+    if path.is_dir():
+        if is_subvolume(path):
+            subprocess.run(['sudo', 'btrfs', 'subvolume', 'delete', str(path)], stdout=subprocess.DEVNULL)
+        else:
+            subprocess.run(['sudo', 'rm', '-rf', '--one-file-system', str(path)])
+    lock = path.with_name(f'{path.name}.lock')
+    if lock.exists():
+        subprocess.run(['sudo', 'rm', '-f', str(lock)])
+
+
+def cleanup_chroots(batch):
+    """Delete the copies left behind by the builds of a batch, like the ones of interrupted builds."""
+    for target in batch.chroots.values_list('target', flat=True):
+        directory = chroot_directory(target)
+        if directory.is_dir():
+            copies = {path.name[:-len('.lock')] if path.name.endswith('.lock') else path.name
+                      for path in directory.glob(f'batch{batch.id}-*')}
+            for name in copies:
+                remove_copy(directory / name)
@@ -0,0 +1,95 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Build, Event, Job
+
+# Seconds between two looks at the database, and before a stream is closed for the browser to reconnect
+POLL_INTERVAL = 1
+STREAM_TIMEOUT = 300
+KEEPALIVE = 15
+RETENTION = timedelta(days=1)
+
+
+def emit(kind, targets, build_id=None):
+    """Record an event for each job or publication in targets."""
+    Event.objects.bulk_create([Event(kind=kind, base_package_id=target.package.base_package_id,
+                                     architecture_id=target.architecture_id, repository_id=target.repository_id,
+                                     build_id=build_id) for target in targets])
+
+
+def prune_events():
+    """Delete the events too old for any page still open to miss them."""
+    Event.objects.filter(created__lt=timezone.now() - RETENTION).delete()
+
+
+def last_event():
+    """Returns the id of the latest event, for pages to stream the events following it."""
+    return Event.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def format_event(id, kind, data):
+    """Returns a Server-Sent Event, data being split into lines since an event field cannot hold newlines."""
+    lines = [f'id: {id}', f'event: {kind}'] + [f'data: {line}' for line in data.split('\n')]
+    return '\n'.join(lines) + '\n\n'
+
+
+def serialize(event):
+    return json.dumps({
+        'base_package': event.base_package.name,
+        'architecture': event.architecture.name,
+        'repository': event.repository.name,
+        'build': event.build_id,
+        'version': event.build.version if event.build else None,
+        'finished': event.build.finished if event.build else None,
+    }, cls=DjangoJSONEncoder)
+
+
+def stream(since, timeout=STREAM_TIMEOUT):
+    """Yields the events following since as they happen, until timeout."""
+    deadline = time.monotonic() + timeout
+    keepalive = time.monotonic() + KEEPALIVE
+    while time.monotonic() < deadline:
+        events = list(Event.objects.filter(id__gt=since).select_related('base_package', 'architecture', 'repository',
+                                                                        'build').order_by('id')[:100])
+        for event in events:
+            yield format_event(event.id, event.kind, serialize(event))
+            since = event.id
+        if events:
+            keepalive = time.monotonic() + KEEPALIVE
+        elif time.monotonic() > keepalive:
+            # Comments keep proxies from closing idle connections
+            yield ': keepalive\n\n'
+            keepalive = time.monotonic() + KEEPALIVE
+        if len(events) < 100:
+            time.sleep(POLL_INTERVAL)
+
+
+def tail(build_id, path, offset, timeout=STREAM_TIMEOUT):
+    """Yields the lines written to a build log after offset, until the build finishes or timeout.
+
+    Event ids are offsets in the log, so a reconnecting browser resumes where it left. Builds left unfinished by a
+    dead worker are over once their job is no longer building.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        finished = Build.objects.filter(id=build_id, finished__isnull=False).exists() or \
+            not Job.objects.filter(build=build_id, state=Job.BUILDING).exists()
+        try:
+            with open(path, 'rb') as log:
+                log.seek(offset)
+                data = log.read()
+        except FileNotFoundError:
+            data = b''
+        # Only send complete lines, unless the build is over
+        end = len(data) if finished else data.rfind(b'\n') + 1
+        if end:
+            offset += end
+            yield format_event(offset, 'log', data[:end].decode(errors='replace').rstrip('\n'))
+        if finished:
+            yield format_event(offset, 'end', '')
+            return
+        time.sleep(POLL_INTERVAL)
@@ -0,0 +1,131 @@
+import logging
+from collections import defaultdict
+
+from .models import BasePackage, Package
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyGraph:
+    """In-memory graph of base packages and the packages they need to build."""
+
+    def __init__(self):
+        self.names = {}
+        self.base_packages = {}
+        self.virtual = set()
+        self.providers = defaultdict(list)
+        self.depends = defaultdict(set)
+
+    @classmethod
+    def load(cls):
+        """Loads the whole graph in a few queries."""
+        graph = cls()
+        for pk, name, base_id, virtual in Package.objects.order_by('name').values_list('id', 'name',
+                                                                                       'base_package_id', 'virtual'):
+            graph.names[pk] = name
+            graph.base_packages[pk] = base_id
+            if virtual:
+                graph.virtual.add(pk)
+        for pkg_id, provided_id in Package.provides.through.objects.values_list('from_package_id', 'to_package_id'):
+            graph.providers[provided_id].append(pkg_id)
+        for base_id, pkg_id in BasePackage.build_depends.through.objects.values_list('basepackage_id', 'package_id'):
+            graph.depends[base_id].add(pkg_id)
+        for providers in graph.providers.values():
+            providers.sort(key=graph.names.get)
+        return graph
+
+    def direct_depends(self, base_id):
+        """Returns the real packages a base package depends on, resolving virtual packages to a provider."""
+        depends = set()
+        real_names = {self.names[pk] for pk in self.depends[base_id] if pk not in self.virtual}
+        for pk in self.depends[base_id]:
+            if pk not in self.virtual:
+                depends.add(pk)
+            elif self.names[pk] not in real_names and self.providers[pk]:
+                depends.add(self.providers[pk][0])
+        # Split packages may depend on each other, which is not a build dependency
+        return {pk for pk in depends if self.base_packages[pk] != base_id}
+
+    def components(self):
+        """Returns the strongly connected components of base packages, dependencies first."""
+        edges = {base_id: {self.base_packages[pk] for pk in self.direct_depends(base_id)}
+                 for base_id in set(self.base_packages.values()) | set(self.depends)}
+        # Iterative Tarjan, deep dependency chains would exceed the recursion limit
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for root in edges:
+            if root in index:
+                continue
+            work = [(root, iter(edges[root]))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, successors = work[-1]
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = lowlink[successor] = len(index)
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor, iter(edges.get(successor, ()))))
+                        break
+                    elif successor in on_stack:
+                        lowlink[node] = min(lowlink[node], index[successor])
+                else:
+                    work.pop()
+                    if work:
+                        lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components, edges
+
+    def closures(self):
+        """Returns the transitive build dependencies of every base package, and the dependency cycles."""
+        components, edges = self.components()
+        closures = {}
+        cycles = []
+        # Tarjan emits a component after every component it depends on
+        for component in components:
+            closure = set()
+            for base_id in component:
+                closure.update(self.direct_depends(base_id))
+                for dependency in edges[base_id]:
+                    if dependency not in component:
+                        closure.update(closures[dependency])
+            if len(component) > 1:
+                cycles.append(component)
+            for base_id in component:
+                closures[base_id] = {pk for pk in closure if self.base_packages[pk] != base_id}
+        return closures, cycles
+
+
+def resolve_build_depends():
+    """Replace the build dependencies of every base package with their transitive closure.
+
+    Returns the dependency cycles as lists of base package names.
+    """
+    graph = DependencyGraph.load()
+    closures, cycles = graph.closures()
+    through = BasePackage.build_depends.through
+    missing = []
+    for base_id, closure in closures.items():
+        current = graph.depends[base_id]
+        if current - closure:
+            through.objects.filter(basepackage_id=base_id, package_id__in=current - closure).delete()
+        missing.extend(through(basepackage_id=base_id, package_id=pk) for pk in closure - current)
+    through.objects.bulk_create(missing, batch_size=500)
+    names = dict(BasePackage.objects.values_list('id', 'name'))
+    cycles = [sorted(names.get(base_id) or str(base_id) for base_id in cycle) for cycle in cycles]
+    for cycle in cycles:
+        logger.warning('Dependency cycle between %s', ', '.join(cycle))
+    return cycles
@@ -0,0 +1,72 @@
+import gzip
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django_q.models import Schedule
+
+from .events import last_event
+from .models import Architecture, Build, Package, Repository
+
+WRITE_INDEX = 'django_pkgbuild.index.write_index'
+
+
+def annotate_last_build(packages):
+    """Annotates packages with the version and date of their latest build."""
+    builds = Build.objects.filter(base_package=OuterRef('base_package'), status=0).order_by('-id')
+    return packages.select_related('base_package').annotate(
+        last_build_version=Subquery(builds.values('version')[:1]),
+        last_build_date=Subquery(builds.values('finished')[:1]))
+
+
+def index_repositories():
+    """Returns the repositories with everything the index template needs prefetched."""
+    packages = annotate_last_build(Package.objects.all())
+    return Repository.objects.prefetch_related('architectures', Prefetch('packages', queryset=packages))
+
+
+def index_context():
+    """Returns the context of the index template."""
+    return {'repositories': index_repositories(),
+            'architectures': Architecture.objects.exclude(name='any'),
+            'targets': Repository.TARGET_CHOICES,
+            'sources_url': settings.PKGBUILD.get('sources_url', ''),
+            'bugs_url': settings.PKGBUILD.get('bugs_url', ''),
+            'static': settings.PKGBUILD.get('static', False),
+            'last_event': last_event()}
+
+
+def replace_file(path, content):
+    """Write to a temporary file and rename it over path, so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, str(path))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def write_index():
+    """Render a static index, along with a precompressed copy for the web server."""
+    root = Path(settings.PKGBUILD['repositories_root'])
+    content = render_to_string('index.html', index_context()).encode()
+    replace_file(root / 'index.html', content)
+    replace_file(root / 'index.html.gz', gzip.compress(content, 9))
+
+
+def request_index():
+    """Schedule a static index render, unless one is already scheduled."""
+    # Django Q deletes run ONCE schedules, or sets their repeats to 0
+    if Schedule.objects.filter(func=WRITE_INDEX, schedule_type=Schedule.ONCE).exclude(repeats=0).exists():
+        return
+    delay = settings.PKGBUILD.get('index_delay', 60)
+    Schedule.objects.create(name='Static Index', func=WRITE_INDEX, schedule_type=Schedule.ONCE, repeats=-1,
+                            next_run=timezone.now() + timedelta(seconds=delay))
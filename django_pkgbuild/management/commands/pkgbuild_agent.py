@@ -0,0 +1,38 @@
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+
+from django_pkgbuild.agents import Agent
+
+
+class Command(BaseCommand):
+    help = 'Build packages handed out by a coordinator'
+
+    def add_arguments(self, parser):
+        parser.add_argument('address', help='Address of the coordinator, unix:/path or host:port')
+        parser.add_argument('--architecture', action='append', required=True, help='Architecture this host builds')
+        parser.add_argument('--target', action='append', required=True,
+                            help='Chroot target this host builds, like extra-x86_64-build')
+        parser.add_argument('--capacity', type=int, default=1, help='Number of concurrent builds')
+        parser.add_argument('--workdir', default='/var/lib/pkgbuild-agent', help='Directory builds happen in')
+        parser.add_argument('--name', default=socket.gethostname(), help='Name of this host')
+        parser.add_argument('--secret-file', help='File holding the secret shared with the coordinator')
+
+    def handle(self, *args, **options):
+        secret = None
+        if options['secret_file']:
+            with open(options['secret_file']) as f:
+                secret = f.read().strip()
+        threads = []
+        for slot in range(options['capacity']):
+            agent = Agent(options['address'], options['name'], options['architecture'], options['target'],
+                          options['workdir'], secret=secret)
+            thread = threading.Thread(target=agent.run, daemon=True)
+            thread.start()
+            threads.append(thread)
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            pass
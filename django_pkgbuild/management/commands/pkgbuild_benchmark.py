@@ -0,0 +1,51 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from django_pkgbuild.benchmark import compare, report, run, stub_tools
+
+
+class Command(BaseCommand):
+    help = 'Time and count the queries of refreshes, repository changes and the index against synthetic PKGBUILD trees'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int, default=[100, 1000],
+                            help='Numbers of base packages to generate, between 100 and 10000 is sensible')
+        parser.add_argument('--chain', type=int, default=100, help='Length of the dependency chains')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Compare with the results of a previous run')
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+        # Never touch the real database, the test runner's database is good enough
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        results = []
+        try:
+            for size in options['sizes']:
+                with tempfile.TemporaryDirectory() as tmp:
+                    pkgbuild = {**settings.PKGBUILD, 'packages_root': f'{tmp}/packages',
+                                'repositories_root': f'{tmp}/repositories', 'logs_root': f'{tmp}/logs',
+                                'static': False}
+                    Path(pkgbuild['repositories_root']).mkdir()
+                    with override_settings(PKGBUILD=pkgbuild), stub_tools():
+                        results += run(Path(pkgbuild['packages_root']), size, options['chain'])
+                self.stdout.write(f'Benchmarked {size} packages')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for result, old in compare(results, previous or {'results': []}):
+            line = f'{result["name"]:<20} {result["packages"]:>6} {result["seconds"]:>10.3f}s {result["queries"]:>8}q'
+            if old:
+                line += f'  was {old["seconds"]:.3f}s {old["queries"]}q'
+            self.stdout.write(line)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report(options['sizes'], results), f, indent=2)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from django_pkgbuild.agents import Coordinator
+
+
+class Command(BaseCommand):
+    help = 'Hand builds to remote build agents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('address', nargs='?', help='unix:/path or host:port, defaults to the agents setting')
+        parser.add_argument('--warm-wait', type=int, default=30,
+                            help='Seconds a build waits for a busy agent which already built it')
+
+    def handle(self, *args, **options):
+        address = options['address'] or settings.PKGBUILD['agents']
+        server = Coordinator(options['warm_wait'], settings.PKGBUILD.get('agents_secret')).server(address)
+        self.stdout.write(f'Waiting for agents and builds on {address}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
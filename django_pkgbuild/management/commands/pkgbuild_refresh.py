@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from django_pkgbuild.tasks import build_changed_packages, refresh_packages, request_refresh
+
+
+class Command(BaseCommand):
+    help = 'Refresh the packages of changed paths, for git hooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help='Changed paths, absolute or relative to packages_root, every package if omitted')
+        parser.add_argument('--now', action='store_true',
+                            help='Refresh and schedule builds right away, rather than merging with other requests')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or None
+        if paths and not options['now']:
+            request_refresh(paths)
+            return
+        refreshed = refresh_packages(paths=paths)
+        self.stdout.write(f'Refreshed {len(refreshed)} packages')
+        build_changed_packages(refreshed)
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from django_pkgbuild.tasks import request_refresh
+from django_pkgbuild.watch import InotifyWatcher, PollingWatcher, watch
+
+
+class Command(BaseCommand):
+    help = 'Refresh packages as soon as their PKGBUILD changes, run it next to qcluster'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', action='store_true', help='Poll modification times instead of using inotify')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds between polls')
+        parser.add_argument('--settle', type=int, default=2,
+                            help='Seconds without changes after which a burst of changes is refreshed')
+
+    def handle(self, *args, **options):
+        root = settings.PKGBUILD['packages_root']
+        if options['poll']:
+            watcher = PollingWatcher(root, options['interval'])
+        else:
+            try:
+                watcher = InotifyWatcher(root)
+            except OSError as e:
+                self.stderr.write(f'inotify is not available ({e}), polling instead')
+                watcher = PollingWatcher(root, options['interval'])
+
+        def refresh(paths):
+            self.stdout.write(f'Requesting a refresh of {len(paths)} changed paths')
+            request_refresh(paths)
+
+        try:
+            watch(watcher, refresh, options['settle'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
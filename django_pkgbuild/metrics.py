@@ -0,0 +1,137 @@
+import time
+from bisect import bisect_left
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Job, Metric
+
+BUILD_BUCKETS = (60, 300, 900, 1800, 3600, 7200, 14400, 28800)
+SHORT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+REFRESH_BUCKETS = (1, 5, 15, 60, 300, 900, 1800, 3600)
+# repo-add rewrites the whole database, which takes minutes for large repositories
+REPO_ADD_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900)
+
+METRICS = {
+    'pkgbuild_builds_in_progress': ('gauge', 'Builds currently running.', None),
+    'pkgbuild_builds_total': ('counter', 'Finished builds by result.', None),
+    'pkgbuild_last_success_timestamp_seconds': ('gauge', 'Time of the latest successful build of a package.', None),
+    'pkgbuild_build_duration_seconds': ('histogram', 'Duration of archbuild runs.', BUILD_BUCKETS),
+    'pkgbuild_parse_srcinfo_duration_seconds': ('histogram', 'Duration of parse_srcinfo calls.', SHORT_BUCKETS),
+    'pkgbuild_refresh_duration_seconds': ('histogram', 'Duration of refresh_packages runs.', REFRESH_BUCKETS),
+    'pkgbuild_repo_add_duration_seconds': ('histogram', 'Duration of repository database updates.', REPO_ADD_BUCKETS),
+}
+
+
+def format_labels(labels):
+    """Returns labels in the Prometheus text format, without braces."""
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{key}="{escape(value)}"' for key, value in sorted(labels.items()))
+
+
+def add(name, labels, value):
+    """Atomically adds value to a sample, creating it if needed."""
+    labels = format_labels(labels)
+    if Metric.objects.filter(name=name, labels=labels).update(value=F('value') + value):
+        return
+    try:
+        with transaction.atomic():
+            Metric.objects.create(name=name, labels=labels, value=value)
+    except IntegrityError:
+        # Created concurrently
+        Metric.objects.filter(name=name, labels=labels).update(value=F('value') + value)
+
+
+def inc(name, labels=None, value=1):
+    """Increments a counter or gauge."""
+    add(name, labels or {}, value)
+
+
+def dec(name, labels=None, value=1):
+    """Decrements a gauge."""
+    add(name, labels or {}, -value)
+
+
+def set_gauge(name, labels, value):
+    """Sets a gauge."""
+    Metric.objects.update_or_create(name=name, labels=format_labels(labels), defaults={'value': value})
+
+
+def observe(name, labels, *values):
+    """Records values in a histogram, with one update per bucket."""
+    if not values:
+        return
+    buckets = METRICS[name][2]
+    counts = [0] * (len(buckets) + 1)
+    for value in values:
+        counts[bisect_left(buckets, value)] += 1
+    cumulative = 0
+    for le, count in zip([*buckets, '+Inf'], counts):
+        cumulative += count
+        if cumulative:
+            add(f'{name}_bucket', {**labels, 'le': le}, cumulative)
+    add(f'{name}_count', labels, len(values))
+    add(f'{name}_sum', labels, sum(values))
+
+
+class Timer:
+    """Context manager observing its duration in a histogram."""
+
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = labels or {}
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *args):
+        self.duration = time.monotonic() - self.start
+        observe(self.name, self.labels, self.duration)
+
+
+def format_value(value):
+    """Returns a sample value, keeping integers exact."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def family(name):
+    """Returns the metric a sample belongs to."""
+    for suffix in ('_bucket', '_count', '_sum'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def exposition():
+    """Returns every metric in the Prometheus text format."""
+    samples = {}
+    for name, labels, value in Metric.objects.order_by('name', 'labels').values_list('name', 'labels', 'value'):
+        samples.setdefault(family(name), []).append((name, labels, value))
+    # Queue depth is the number of jobs waiting per Django Q group, which is the repository name
+    samples['pkgbuild_queue_depth'] = [
+        ('pkgbuild_queue_depth', format_labels({'group': row['repository__name'], 'state': row['state']}),
+         row['count'])
+        for row in Job.objects.filter(state__in=[Job.PENDING, Job.READY, Job.QUEUED])
+        .values('repository__name', 'state').annotate(count=Count('id')).order_by('repository__name', 'state')
+    ]
+    now = time.time()
+    samples['pkgbuild_last_success_age_seconds'] = [
+        ('pkgbuild_last_success_age_seconds', labels, now - value)
+        for name, labels, value in samples.get('pkgbuild_last_success_timestamp_seconds', [])
+    ]
+    descriptions = {
+        **{name: (kind, description) for name, (kind, description, buckets) in METRICS.items()},
+        'pkgbuild_queue_depth': ('gauge', 'Jobs waiting per Django Q group.'),
+        'pkgbuild_last_success_age_seconds': ('gauge', 'Age of the latest successful build of a package.'),
+    }
+    lines = []
+    for metric, rows in sorted(samples.items()):
+        kind, description = descriptions.get(metric, ('untyped', metric))
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for name, labels, value in rows:
+            sample = f'{name}{{{labels}}}' if labels else name
+            lines.append(f'{sample} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Refresh',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.CharField(max_length=40, null=True)),
+                ('date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='basepackage',
+            name='pkgbuild_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
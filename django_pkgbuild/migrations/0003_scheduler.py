@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 10:03
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0002_incremental_refresh'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Batch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Batches',
+            },
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('force', models.BooleanField(default=False)),
+                ('state', models.CharField(choices=[('pending', 'pending'), ('queued', 'queued'), ('built', 'built'), ('failed', 'failed'), ('skipped', 'skipped')], default='pending', max_length=8)),
+                ('architecture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.Architecture')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='django_pkgbuild.Batch')),
+                ('depends', models.ManyToManyField(related_name='reverse_depends', to='django_pkgbuild.Job')),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.Package')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.Repository')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 10:41
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0003_scheduler'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatabaseUpdate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('add', 'add'), ('remove', 'remove')], max_length=8)),
+                ('name', models.CharField(max_length=32)),
+                ('filename', models.CharField(max_length=128, null=True)),
+                ('architecture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.Architecture')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='database_updates', to='django_pkgbuild.Repository')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 11:26
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0004_databaseupdate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='state',
+            field=models.CharField(choices=[('pending', 'pending'), ('queued', 'queued'), ('building', 'building'), ('built', 'built'), ('failed', 'failed'), ('skipped', 'skipped')], default='pending', max_length=8),
+        ),
+    ]
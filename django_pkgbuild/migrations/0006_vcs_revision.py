@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 12:08
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0005_job_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basepackage',
+            name='vcs_revision',
+            field=models.CharField(max_length=128, null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='revision',
+            field=models.CharField(max_length=128, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='revision',
+            field=models.CharField(max_length=128, null=True),
+        ),
+    ]
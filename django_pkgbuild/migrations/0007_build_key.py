@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 12:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0006_vcs_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='key',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='rebuild',
+            field=models.BooleanField(default=False),
+        ),
+    ]
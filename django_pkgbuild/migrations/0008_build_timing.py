@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 13:32
+from __future__ import unicode_literals
+
+from datetime import datetime, time
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def date_to_finished(apps, schema_editor):
+    """Builds used to be recorded on success only, with their date."""
+    Build = apps.get_model('django_pkgbuild', 'Build')
+    for build in Build.objects.exclude(date=None):
+        build.started = build.finished = timezone.make_aware(datetime.combine(build.date, time()))
+        build.status = 0
+        build.save()
+
+
+def finished_to_date(apps, schema_editor):
+    Build = apps.get_model('django_pkgbuild', 'Build')
+    for build in Build.objects.exclude(finished=None):
+        build.date = build.finished.date()
+        build.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0007_build_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='started',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='finished',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='status',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.RunPython(date_to_finished, finished_to_date),
+        migrations.RemoveField(
+            model_name='build',
+            name='date',
+        ),
+        migrations.CreateModel(
+            name='BuildPhase',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=16)),
+                ('duration', models.FloatField()),
+                ('build', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='phases', to='django_pkgbuild.Build')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='build',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='django_pkgbuild.Build'),
+        ),
+    ]
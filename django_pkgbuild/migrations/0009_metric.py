@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 14:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0008_build_timing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Metric',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64)),
+                ('labels', models.CharField(blank=True, max_length=256)),
+                ('value', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='metric',
+            unique_together=set([('name', 'labels')]),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 14:52
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0009_metric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Publication',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('architecture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.Architecture')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='publications', to='django_pkgbuild.Job')),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.Package')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.Repository')),
+            ],
+        ),
+    ]
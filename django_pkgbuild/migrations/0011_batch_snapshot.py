@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 15:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0010_publication'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='snapshot',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 15:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0011_batch_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefreshRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=256)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
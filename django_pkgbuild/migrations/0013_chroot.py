@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 17:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0012_refreshrequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Chroot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(max_length=32)),
+                ('state', models.CharField(choices=[('preparing', 'preparing'), ('ready', 'ready'), ('failed', 'failed')], default='preparing', max_length=16)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chroots', to='django_pkgbuild.Batch')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='chroot',
+            unique_together=set([('batch', 'target')]),
+        ),
+    ]
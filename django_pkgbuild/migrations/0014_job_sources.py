@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 17:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0013_chroot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='sources',
+            field=models.CharField(choices=[('fetching', 'fetching'), ('fetched', 'fetched'), ('failed', 'failed')], max_length=8, null=True),
+        ),
+    ]
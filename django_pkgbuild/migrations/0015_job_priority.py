@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 18:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0014_job_sources'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'interactive'), (1, 'dependency'), (2, 'nightly')], default=2),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='state',
+            field=models.CharField(choices=[('pending', 'pending'), ('ready', 'ready'), ('queued', 'queued'), ('building', 'building'), ('built', 'built'), ('failed', 'failed'), ('skipped', 'skipped')], default='pending', max_length=8),
+        ),
+    ]
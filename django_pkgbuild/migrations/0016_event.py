@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 19:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pkgbuild', '0015_job_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('queued', 'queued'), ('building', 'building'), ('built', 'built'), ('failed', 'failed'), ('skipped', 'skipped'), ('published', 'published')], max_length=16)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('architecture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.Architecture')),
+                ('base_package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.BasePackage')),
+                ('build', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='django_pkgbuild.Build')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='django_pkgbuild.Repository')),
+            ],
+        ),
+    ]
@@ -31,14 +31,6 @@ class Package(models.Model):
         """Returns True if both have the same name."""
         return self.name == other.name
 
-    def __lt__(self, other):
-        """Returns True if other depends on self."""
-        return self in other.base_package.build_depends.all()
-
-    def __gt__(self, other):
-        """Returns True if self depends on other."""
-        return self not in other.base_package.build_depends.all()
-
     def __str__(self):
         return f'{self.name} ({self.base_package.name})' if self.name != self.base_package.name else self.name
 
@@ -51,17 +43,38 @@ class Build(models.Model):
     version = models.CharField(max_length=32)
     architecture = models.ForeignKey(Architecture)
     target = models.CharField(max_length=32, null=True)
-    date = models.DateField(null=True)
+    revision = models.CharField(max_length=128, null=True)
+    key = models.CharField(max_length=64, null=True)
+    started = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+    status = models.IntegerField(null=True)
+
+    def duration(self):
+        """Returns the duration of the build in seconds."""
+        if self.started is None or self.finished is None:
+            return None
+        return (self.finished - self.started).total_seconds()
 
     def __str__(self):
         return f'{self.base_package.name}-{self.version}-{self.target}-{self.architecture.name}'
 
 
+class BuildPhase(models.Model):
+    build = models.ForeignKey(Build, models.CASCADE, related_name='phases')
+    name = models.CharField(max_length=16)
+    duration = models.FloatField()
+
+    def __str__(self):
+        return f'{self.build} {self.name} ({self.duration:.1f}s)'
+
+
 class BasePackage(models.Model):
     base_directory = models.FilePathField(path=settings.PKGBUILD['packages_root'], recursive=True, allow_files=False,
                                           allow_folders=True, max_length=128, unique=True)
     name = models.CharField(max_length=32, null=True)
     version = models.CharField(max_length=32, null=True)
+    pkgbuild_hash = models.CharField(max_length=64, null=True)
+    vcs_revision = models.CharField(max_length=128, null=True)
     architectures = models.ManyToManyField(Architecture, symmetrical=False)
     build_depends = models.ManyToManyField(Package, related_name='reverse_build_depends', symmetrical=False, blank=True)
     building = models.BooleanField(default=False)
@@ -78,6 +91,178 @@ class BasePackage(models.Model):
         ordering = ['name']
 
 
+class Batch(models.Model):
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True)
+    snapshot = models.BinaryField(null=True)
+
+    def __str__(self):
+        return f'{self.id} ({self.created})'
+
+    class Meta:
+        verbose_name_plural = 'Batches'
+
+
+class Chroot(models.Model):
+    PREPARING = 'preparing'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATE_CHOICES = (
+        (PREPARING, 'preparing'),
+        (READY, 'ready'),
+        (FAILED, 'failed'),
+    )
+
+    batch = models.ForeignKey(Batch, models.CASCADE, related_name='chroots')
+    target = models.CharField(max_length=32)
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=PREPARING)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.target} ({self.batch_id})'
+
+    class Meta:
+        unique_together = ('batch', 'target')
+
+
+class DatabaseUpdate(models.Model):
+    ADD = 'add'
+    REMOVE = 'remove'
+    ACTION_CHOICES = (
+        (ADD, 'add'),
+        (REMOVE, 'remove'),
+    )
+
+    repository = models.ForeignKey('Repository', models.CASCADE, related_name='database_updates')
+    architecture = models.ForeignKey(Architecture, models.CASCADE)
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+    name = models.CharField(max_length=32)
+    filename = models.CharField(max_length=128, null=True)
+
+    def __str__(self):
+        return f'{self.action} {self.name} ({self.repository.name}/{self.architecture.name})'
+
+
+class Event(models.Model):
+    QUEUED = 'queued'
+    BUILDING = 'building'
+    BUILT = 'built'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+    PUBLISHED = 'published'
+    KIND_CHOICES = (
+        (QUEUED, 'queued'),
+        (BUILDING, 'building'),
+        (BUILT, 'built'),
+        (FAILED, 'failed'),
+        (SKIPPED, 'skipped'),
+        (PUBLISHED, 'published'),
+    )
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    base_package = models.ForeignKey(BasePackage, models.CASCADE)
+    architecture = models.ForeignKey(Architecture, models.CASCADE)
+    repository = models.ForeignKey('Repository', models.CASCADE)
+    build = models.ForeignKey(Build, models.SET_NULL, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.base_package.name}-{self.architecture.name} {self.kind} ({self.created})'
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    READY = 'ready'
+    QUEUED = 'queued'
+    BUILDING = 'building'
+    BUILT = 'built'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+    STATE_CHOICES = (
+        (PENDING, 'pending'),
+        (READY, 'ready'),
+        (QUEUED, 'queued'),
+        (BUILDING, 'building'),
+        (BUILT, 'built'),
+        (FAILED, 'failed'),
+        (SKIPPED, 'skipped'),
+    )
+    FETCHING = 'fetching'
+    FETCHED = 'fetched'
+    SOURCES_CHOICES = (
+        (FETCHING, 'fetching'),
+        (FETCHED, 'fetched'),
+        (FAILED, 'failed'),
+    )
+    INTERACTIVE = 0
+    DEPENDENCY = 1
+    NIGHTLY = 2
+    PRIORITY_CHOICES = (
+        (INTERACTIVE, 'interactive'),
+        (DEPENDENCY, 'dependency'),
+        (NIGHTLY, 'nightly'),
+    )
+
+    batch = models.ForeignKey(Batch, models.CASCADE, related_name='jobs')
+    package = models.ForeignKey(Package, models.CASCADE)
+    architecture = models.ForeignKey(Architecture, models.CASCADE)
+    repository = models.ForeignKey('Repository', models.CASCADE)
+    force = models.BooleanField(default=False)
+    rebuild = models.BooleanField(default=False)
+    revision = models.CharField(max_length=128, null=True)
+    state = models.CharField(max_length=8, choices=STATE_CHOICES, default=PENDING)
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=NIGHTLY)
+    updated = models.DateTimeField(auto_now=True)
+    build = models.ForeignKey(Build, models.SET_NULL, null=True)
+    sources = models.CharField(max_length=8, choices=SOURCES_CHOICES, null=True)
+    depends = models.ManyToManyField('self', related_name='reverse_depends', symmetrical=False)
+
+    def task_name(self):
+        """Returns the Django Q task name."""
+        return f'{self.package.name}-{self.package.base_package.version}-{self.repository.target}-{self.architecture}'
+
+    def __str__(self):
+        return f'{self.task_name()} ({self.state})'
+
+
+class Metric(models.Model):
+    name = models.CharField(max_length=64)
+    labels = models.CharField(max_length=256, blank=True)
+    value = models.FloatField(default=0)
+
+    def __str__(self):
+        return f'{self.name}{{{self.labels}}} {self.value}'
+
+    class Meta:
+        unique_together = ('name', 'labels')
+
+
+class Publication(models.Model):
+    job = models.ForeignKey(Job, models.CASCADE, related_name='publications')
+    package = models.ForeignKey(Package, models.CASCADE)
+    repository = models.ForeignKey('Repository', models.CASCADE)
+    architecture = models.ForeignKey(Architecture, models.CASCADE)
+
+    def __str__(self):
+        return f'{self.package.name} ({self.repository.name}/{self.architecture.name})'
+
+
+class Refresh(models.Model):
+    revision = models.CharField(max_length=40, null=True)
+    date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.revision or "-"} ({self.date})'
+
+
+class RefreshRequest(models.Model):
+    path = models.CharField(max_length=256)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path
+
+
 class Repository(models.Model):
     EXTRA = 'extra'
     TESTING = 'testing'
@@ -0,0 +1,38 @@
+import re
+import subprocess
+import sys
+import time
+
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+# Lines printed by devtools and makepkg when a build moves to the next phase
+MARKERS = (
+    ('dependencies', re.compile(r'^(loading packages\.\.\.|==> Installing missing dependencies)')),
+    ('sources', re.compile(r'^==> Retrieving sources')),
+    ('compile', re.compile(r'^==> Starting (pkgver|prepare|build|check)\(\)')),
+    ('package', re.compile(r'^==> Entering fakeroot environment')),
+    ('cleanup', re.compile(r'^==> Finished making')),
+)
+PHASES = ('chroot',) + tuple(name for name, marker in MARKERS)
+
+
+def run_timed(cmd, cwd, log, echo=False):
+    """Run a build command, write its output to log, and return its exit status and the duration of each phase."""
+    durations = {}
+    phase = 0
+    start = time.monotonic()
+    with subprocess.Popen(cmd, cwd=str(cwd), stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as proc:
+        for line in proc.stdout:
+            log.write(line)
+            log.flush()
+            if echo:
+                sys.stdout.buffer.write(line)
+            text = ANSI_ESCAPE.sub('', line.decode(errors='replace'))
+            for index, (name, marker) in enumerate(MARKERS[phase:], start=phase + 1):
+                if marker.match(text):
+                    now = time.monotonic()
+                    durations[PHASES[phase]] = now - start
+                    phase = index
+                    start = now
+                    break
+    durations[PHASES[phase]] = time.monotonic() - start
+    return proc.returncode, durations
@@ -0,0 +1,118 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Build, Job
+
+logger = logging.getLogger(__name__)
+
+# Sources still being fetched after this long are assumed abandoned by a killed worker, and fetched again
+FETCH_TIMEOUT = timedelta(hours=1)
+
+
+def prefetch_enabled():
+    """Returns True if the sources of jobs are to be fetched ahead of their builds."""
+    if not settings.PKGBUILD.get('prefetch_concurrency', 0) or settings.PKGBUILD.get('agents'):
+        return False
+    if not settings.PKGBUILD.get('srcdest'):
+        logger.warning('Not prefetching sources, prefetch_concurrency requires srcdest')
+        return False
+    return True
+
+
+def verify_sources(directory, log):
+    """Download the sources of a PKGBUILD to srcdest and verify them, like makechrootpkg does before building.
+
+    Returns the exit status of makepkg.
+    """
+    env = {**os.environ, 'SRCDEST': settings.PKGBUILD['srcdest']}
+    return subprocess.run(['makepkg', '--verifysource', '--nodeps', '--noconfirm'], cwd=str(directory), env=env,
+                          stdout=log, stderr=subprocess.STDOUT).returncode
+
+
+def needing_sources(jobs):
+    """Returns the jobs which will probably build, rather than reuse the artifacts of their current version."""
+    builds = Build.objects.filter(base_package=OuterRef('package__base_package'),
+                                  version=OuterRef('package__base_package__version'), status=0)
+    return jobs.annotate(built=Exists(builds)).filter(Q(built=False) | Q(force=True) | Q(rebuild=True) |
+                                                      Q(revision__isnull=False))
+
+
+def claim(job, retry=False):
+    """Mark the sources of a job as being fetched, and return True unless someone else fetched or is fetching them.
+
+    Retries also take over the fetches abandoned for FETCH_TIMEOUT.
+    """
+    unfetched = Q(sources__isnull=True)
+    if retry:
+        unfetched |= Q(sources=Job.FAILED) | Q(sources=Job.FETCHING, updated__lt=timezone.now() - FETCH_TIMEOUT)
+    return Job.objects.filter(unfetched, id=job.id).update(sources=Job.FETCHING, updated=timezone.now()) == 1
+
+
+def fetch(job, log):
+    """Fetch the sources of a claimed job, and return True if they were verified."""
+    status = None
+    try:
+        status = verify_sources(job.package.base_package.directory(), log)
+    finally:
+        # Never leave the sources fetching for the build to wait on
+        Job.objects.filter(id=job.id).update(sources=Job.FETCHED if status == 0 else Job.FAILED)
+    return status == 0
+
+
+def fetch_sources(job, log_path):
+    """Make sure the sources of a job are in srcdest before it builds, and return False if they could not be.
+
+    Sources left unfetched or failed by prefetching are fetched again with their output in log_path, and the ones
+    being prefetched are waited for, up to FETCH_TIMEOUT.
+    """
+    while not claim(job, retry=True):
+        if Job.objects.filter(id=job.id, sources=Job.FETCHED).exists():
+            return True
+        time.sleep(1)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, 'wb') as log:
+        return fetch(job, log)
+
+
+def upcoming_jobs(job, count):
+    """Returns the next jobs of a batch whose sources were not fetched, ready ones first, by priority."""
+    jobs = needing_sources(Job.objects.filter(batch=job.batch_id, sources__isnull=True).exclude(id=job.id)) \
+        .select_related('package__base_package').order_by('priority', 'id')
+    ready = list(jobs.filter(state__in=(Job.READY, Job.QUEUED))[:count])
+    return ready + list(jobs.filter(state=Job.PENDING)[:count - len(ready)])
+
+
+def prefetch(jobs):
+    """Fetch the sources of jobs nobody claimed yet, ignoring failures which their build retries."""
+    try:
+        for job in jobs:
+            if claim(job):
+                fetch(job, subprocess.DEVNULL)
+    finally:
+        connection.close()
+
+
+def start_prefetch(job):
+    """Fetch the sources of the jobs coming after job in the background, prefetch_concurrency at a time."""
+    concurrency = settings.PKGBUILD['prefetch_concurrency']
+    jobs = upcoming_jobs(job, concurrency)
+    if not jobs:
+        return None
+
+    def run():
+        with ThreadPoolExecutor(concurrency) as executor:
+            executor.map(prefetch, [[job] for job in jobs])
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,190 @@
+import base64
+import gzip
+import hashlib
+import io
+import tarfile
+from pathlib import Path
+
+from .index import replace_file
+
+# Sections of a desc file, in the order repo-add writes them, and the .PKGINFO keys they come from
+DESC = (
+    ('FILENAME', None),
+    ('NAME', 'pkgname'),
+    ('BASE', 'pkgbase'),
+    ('VERSION', 'pkgver'),
+    ('DESC', 'pkgdesc'),
+    ('GROUPS', 'group'),
+    ('CSIZE', None),
+    ('ISIZE', 'size'),
+    ('MD5SUM', None),
+    ('SHA256SUM', None),
+    ('PGPSIG', None),
+    ('URL', 'url'),
+    ('LICENSE', 'license'),
+    ('ARCH', 'arch'),
+    ('BUILDDATE', 'builddate'),
+    ('PACKAGER', 'packager'),
+    ('REPLACES', 'replaces'),
+    ('CONFLICTS', 'conflict'),
+    ('PROVIDES', 'provides'),
+    ('DEPENDS', 'depend'),
+    ('OPTDEPENDS', 'optdepend'),
+    ('MAKEDEPENDS', 'makedepend'),
+    ('CHECKDEPENDS', 'checkdepend'),
+)
+BLOCKSIZE = tarfile.BLOCKSIZE
+
+
+def read_package(path):
+    """Returns the .PKGINFO fields of a package archive, and the files it installs as listed by bsdtar."""
+    pkginfo = {}
+    files = []
+    with tarfile.open(str(path), 'r:*') as archive:
+        for member in archive:
+            if member.name == '.PKGINFO':
+                for line in archive.extractfile(member).read().decode().splitlines():
+                    if line.startswith('#') or ' = ' not in line:
+                        continue
+                    key, value = line.split(' = ', maxsplit=1)
+                    pkginfo.setdefault(key, []).append(value)
+            elif not member.name.startswith('.'):
+                files.append(member.name + '/' if member.isdir() else member.name)
+    return pkginfo, sorted(set(files))
+
+
+def checksum(path, algorithm):
+    """Returns the hex digest of a file."""
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def format_desc(path):
+    """Returns the name, version and desc file of a package, along with its files section."""
+    pkginfo, files = read_package(path)
+    computed = {
+        'FILENAME': [path.name],
+        'CSIZE': [str(path.stat().st_size)],
+        'MD5SUM': [checksum(path, 'md5')],
+        'SHA256SUM': [checksum(path, 'sha256')],
+    }
+    signature = Path(f'{path}.sig')
+    if signature.is_file():
+        computed['PGPSIG'] = [base64.b64encode(signature.read_bytes()).decode()]
+    desc = ''
+    for section, key in DESC:
+        values = computed.get(section, []) if key is None else pkginfo.get(key, [])
+        if values:
+            desc += f'%{section}%\n' + ''.join(f'{value}\n' for value in values) + '\n'
+    files = '%FILES%\n' + ''.join(f'{name}\n' for name in files) + '\n'
+    return pkginfo['pkgname'][0], pkginfo['pkgver'][0], desc.encode(), files.encode()
+
+
+def tar_entry(directory, members, mtime):
+    """Returns the tar blocks of a package directory and its files, without the end of archive blocks."""
+    info = tarfile.TarInfo(f'{directory}/')
+    info.type = tarfile.DIRTYPE
+    info.mode = 0o755
+    info.mtime = mtime
+    blocks = [info.tobuf(tarfile.PAX_FORMAT)]
+    for name, data in members:
+        info = tarfile.TarInfo(f'{directory}/{name}')
+        info.size = len(data)
+        info.mode = 0o644
+        info.mtime = mtime
+        blocks += [info.tobuf(tarfile.PAX_FORMAT), data, b'\0' * (-len(data) % BLOCKSIZE)]
+    return b''.join(blocks)
+
+
+def compress(data):
+    """Returns data as a standalone gzip member, which can be concatenated with others."""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+# Two empty blocks end a tar archive
+END = compress(b'\0' * BLOCKSIZE * 2)
+
+
+class RepoDatabase:
+    """A repository database kept as one compressed tar chunk per package.
+
+    Gzip streams may be made of several members, so the .db and .files archives are rewritten by concatenating the
+    chunks of every package, and only added packages are compressed.
+    """
+
+    def __init__(self, directory, name):
+        self.directory = Path(directory)
+        self.name = name
+        self.index = self.directory / f'.{name}.index'
+
+    def chunks(self, suffix):
+        """Returns the chunks of every package for the .db or .files archive, sorted by package name."""
+        return sorted(self.index.glob(f'*.{suffix}.gz'))
+
+    def add(self, path):
+        """Index a package archive, replacing any other version of it."""
+        name, version, desc, files = format_desc(Path(path))
+        mtime = int(Path(path).stat().st_mtime)
+        entry = f'{name}-{version}'
+        replace_file(self.index / f'{name}.db.gz', compress(tar_entry(entry, [('desc', desc)], mtime)))
+        replace_file(self.index / f'{name}.files.gz',
+                     compress(tar_entry(entry, [('desc', desc), ('files', files)], mtime)))
+
+    def remove(self, name):
+        """Remove a package from the index."""
+        for suffix in ('db', 'files'):
+            path = self.index / f'{name}.{suffix}.gz'
+            if path.exists():
+                path.unlink()
+
+    def bootstrap(self):
+        """Index the entries of an existing database, like one written by repo-add."""
+        self.index.mkdir()
+        path = self.directory / f'{self.name}.files.tar.gz'
+        if not path.is_file():
+            return
+        entries = {}
+        with tarfile.open(str(path), 'r:gz') as archive:
+            for member in archive:
+                if member.isfile():
+                    entry, filename = member.name.split('/', maxsplit=1)
+                    entries.setdefault(entry, {})[filename] = (archive.extractfile(member).read(), member.mtime)
+        for entry, members in entries.items():
+            name = entry.rsplit('-', maxsplit=2)[0]
+            desc, mtime = members['desc']
+            files = [(filename, data) for filename, (data, member_mtime) in sorted(members.items())]
+            replace_file(self.index / f'{name}.db.gz', compress(tar_entry(entry, [('desc', desc)], mtime)))
+            replace_file(self.index / f'{name}.files.gz', compress(tar_entry(entry, files, mtime)))
+
+    def write(self):
+        """Write the .db and .files archives from the index, along with their symlinks."""
+        for suffix in ('db', 'files'):
+            content = b''.join(chunk.read_bytes() for chunk in self.chunks(suffix)) + END
+            archive = self.directory / f'{self.name}.{suffix}.tar.gz'
+            replace_file(archive, content)
+            link = self.directory / f'{self.name}.{suffix}'
+            if not link.is_symlink():
+                if link.exists():
+                    link.unlink()
+                link.symlink_to(archive.name)
+
+    def update(self, removes, adds):
+        """Remove packages by name, add package archives by file name, and rewrite the database."""
+        if not self.index.is_dir():
+            self.bootstrap()
+        for name in removes:
+            self.remove(name)
+        for filename in adds:
+            self.add(self.directory / filename)
+        self.write()
+
+
+def update_repodb(directory, name, removes, adds):
+    """Apply removals and additions to a repository database without repo-add."""
+    RepoDatabase(directory, name).update(removes, adds)
@@ -0,0 +1,181 @@
+from collections import Counter, defaultdict
+from multiprocessing import cpu_count
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+from django_q.tasks import async
+
+from .events import emit
+from .models import Batch, BasePackage, Build, Event, Job, Publication
+from .snapshot import Snapshot
+from .vcs import probe_packages
+
+DISPATCHED = (Job.QUEUED, Job.BUILDING)
+RUNNING = (Job.READY,) + DISPATCHED
+UNFINISHED = (Job.PENDING,) + RUNNING
+UNSUCCESSFUL = (Job.FAILED, Job.SKIPPED)
+
+
+def job_key(base_package, repository, architecture, any_bases):
+    """Returns what identifies the artifacts of a build: base package, version, chroot target and package arch."""
+    if base_package.id in any_bases:
+        # The artifacts of any packages are the same for every architecture
+        return base_package.id, base_package.version, repository.target, 'any'
+    return base_package.id, base_package.version, repository.chbuild(architecture), architecture.name
+
+
+def schedule(targets, force=False, rebuild=False, rebuilds=(), priority=Job.NIGHTLY):
+    """Create a batch of jobs from (package, repository) pairs and queue the ones without dependencies.
+
+    Targets sharing a base package, version, chroot target and package architecture are built by a single job, which
+    publishes its artifacts to each of them. Packages whose base package id is in rebuilds are rebuilt even if their
+    version was already built. Jobs of a higher priority, a lower value, are built before the ones of other batches.
+    """
+    targets = list(targets)
+    # Builds read the package graph from this snapshot rather than querying it over and over
+    batch = Batch.objects.create(snapshot=Snapshot.load().dumps())
+    base_ids = {pkg.base_package_id for pkg, repo in targets}
+    any_bases = set(BasePackage.objects.filter(id__in=base_ids, architectures__name='any')
+                    .values_list('id', flat=True))
+    # Probe every VCS package at once rather than from each build
+    revisions = probe_packages({pkg.base_package for pkg, repo in targets})
+    jobs = {}
+    publications = defaultdict(list)
+    for pkg, repo in targets:
+        for arch in repo.architectures.all():
+            key = job_key(pkg.base_package, repo, arch, any_bases)
+            if key not in jobs:
+                jobs[key] = Job(batch=batch, package=pkg, architecture=arch, repository=repo, force=force,
+                                rebuild=rebuild or pkg.base_package_id in rebuilds,
+                                revision=revisions[pkg.base_package_id], priority=priority)
+            publications[key].append((pkg, repo, arch))
+    Job.objects.bulk_create(jobs.values())
+    # Fetch the jobs again since bulk_create does not set primary keys on every backend
+    jobs = {job_key(job.package.base_package, job.repository, job.architecture, any_bases): job
+            for job in batch.jobs.select_related('package__base_package', 'repository', 'architecture')}
+    emit(Event.QUEUED, jobs.values())
+    Publication.objects.bulk_create([Publication(job=jobs[key], package=pkg, repository=repo, architecture=arch)
+                                     for key, targets in publications.items() for pkg, repo, arch in targets],
+                                    batch_size=500)
+    # A job depends on the jobs publishing its build dependencies for the architecture it builds on
+    jobs_by_base_arch = defaultdict(set)
+    for key, targets in publications.items():
+        for pkg, repo, arch in targets:
+            jobs_by_base_arch[key[0], arch.id].add(jobs[key])
+    depends = defaultdict(set)
+    for base_id, dep_base_id in BasePackage.build_depends.through.objects.filter(
+            basepackage_id__in=base_ids).values_list('basepackage_id', 'package__base_package_id'):
+        depends[base_id].add(dep_base_id)
+    edges = []
+    for job in jobs.values():
+        for dep_base_id in depends[job.package.base_package_id]:
+            for dependency in jobs_by_base_arch[dep_base_id, job.architecture_id]:
+                edges.append(Job.depends.through(from_job_id=job.id, to_job_id=dependency.id))
+    Job.depends.through.objects.bulk_create(edges, batch_size=500)
+    release_jobs(batch)
+    return batch
+
+
+def release_jobs(batch):
+    """Mark the pending jobs whose dependencies have been built as ready, skip the ones whose dependencies failed."""
+    with transaction.atomic():
+        pending = Job.objects.select_for_update().filter(batch=batch, state=Job.PENDING)
+        skipped = {job.id: job for job in pending.filter(depends__state__in=UNSUCCESSFUL).select_related('package')}
+        Job.objects.filter(id__in=skipped).update(state=Job.SKIPPED, updated=timezone.now())
+        emit(Event.SKIPPED, skipped.values())
+        ready = list(pending.exclude(depends__state__in=UNFINISHED))
+        if not ready and not batch.jobs.filter(state__in=RUNNING).exists() and pending.exists():
+            # Only dependency cycles are left, break one with the least blocked job rather than waiting forever
+            ready = [min(pending, key=lambda job: job.depends.filter(state__in=UNFINISHED).count())]
+        Job.objects.filter(id__in=[job.id for job in ready]).update(state=Job.READY, updated=timezone.now())
+    dispatch_jobs()
+    if not batch.jobs.filter(state__in=UNFINISHED).exists():
+        batch.finished = timezone.now()
+        # Only running jobs read the snapshot
+        batch.snapshot = None
+        batch.save()
+
+
+def slots():
+    """Returns how many jobs are handed to the cluster at once, its number of workers by default."""
+    return settings.PKGBUILD.get('slots', getattr(settings, 'Q_CLUSTER', {}).get('workers', cpu_count()))
+
+
+def pick_jobs(ready, dispatched, count):
+    """Returns up to count jobs among ready ones, in the order they should be dispatched.
+
+    Jobs of the highest priority go first. Among them, each pick goes to the repository with the fewest dispatched
+    jobs, so that every repository gets its share of the workers, and then to the oldest job.
+    """
+    ready = sorted(ready, key=lambda job: (job.priority, job.id))
+    dispatched = Counter(dispatched)
+    picked = []
+    while ready and len(picked) < count:
+        candidates = [job for job in ready if job.priority == ready[0].priority]
+        job = min(candidates, key=lambda job: (dispatched[job.repository_id], job.id))
+        ready.remove(job)
+        dispatched[job.repository_id] += 1
+        picked.append(job)
+    return picked
+
+
+def dispatch_jobs():
+    """Send ready jobs to the Django Q cluster while it has free slots.
+
+    Django Q runs tasks in the order they were sent, so only as many jobs as there are workers are sent at once, which
+    lets jobs of a higher priority go ahead of a long batch.
+    """
+    with transaction.atomic():
+        ready = list(Job.objects.select_for_update().filter(state=Job.READY)
+                     .select_related('package__base_package', 'repository', 'architecture'))
+        dispatched = list(Job.objects.filter(state__in=DISPATCHED).values_list('repository', flat=True))
+        picked = pick_jobs(ready, dispatched, slots() - len(dispatched))
+        Job.objects.filter(id__in=[job.id for job in picked]).update(state=Job.QUEUED, updated=timezone.now())
+    for job in picked:
+        dispatch(job)
+
+
+def prioritize(jobs, priority=Job.INTERACTIVE):
+    """Raise the priority of unfinished jobs, and of the unfinished jobs they wait for, then dispatch them."""
+    ids = set(jobs.filter(state__in=UNFINISHED).values_list('id', flat=True))
+    waited = ids
+    while waited:
+        waited = set(Job.objects.filter(reverse_depends__in=waited, state__in=UNFINISHED)
+                     .values_list('id', flat=True)) - ids
+        ids |= waited
+    Job.objects.filter(id__in=ids, priority__gt=priority).update(priority=priority, updated=timezone.now())
+    dispatch_jobs()
+
+
+def dispatch(job):
+    """Send a job to the Django Q cluster."""
+    async('django_pkgbuild.tasks.build_job', job.id,
+          group=job.repository.name, task_name=job.task_name(), hook='django_pkgbuild.tasks.build_job_hook')
+
+
+def estimate_batch(batch, workers=1):
+    """Returns the estimated seconds left in a batch, from the last successful build of each job, and the number of
+    jobs without build history."""
+    builds = Build.objects.filter(Q(architecture=OuterRef('architecture')) | Q(architecture__name='any'),
+                                  base_package=OuterRef('package__base_package'), status=0,
+                                  started__isnull=False, finished__isnull=False).order_by('-id')
+    jobs = batch.jobs.filter(state__in=UNFINISHED).annotate(
+        last_build_started=Subquery(builds.values('started')[:1]),
+        last_build_finished=Subquery(builds.values('finished')[:1]))
+    total = 0
+    unknown = 0
+    for started, finished in jobs.values_list('last_build_started', 'last_build_finished'):
+        if started is None:
+            unknown += 1
+        else:
+            total += (finished - started).total_seconds()
+    return total / workers, unknown
+
+
+def finish_job(job, success):
+    """Record the outcome of a job and queue the jobs it unblocked."""
+    job.state = Job.BUILT if success else Job.FAILED
+    job.save()
+    release_jobs(job.batch)
@@ -2,7 +2,7 @@ from django.db.models import Q
 from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
 
-from .tasks import remove_package_from_database
+from .tasks import remove_package_from_database, update_database
 from .models import BasePackage, Package, Repository
 
 
@@ -51,3 +51,4 @@ def remove_package_from_repo(sender, instance, action, reverse, model, pk_set, u
         for arch in instance.architectures.all():
             for pkg in Package.objects.filter(id__in=pk_set):
                 remove_package_from_database(pkg, arch, instance)
+            update_database(instance, arch)
@@ -0,0 +1,148 @@
+import pickle
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+from .models import Architecture, BasePackage, Batch, Package, Refresh, Repository
+
+
+class Record:
+    """Pickles as a plain tuple, which keeps batch snapshots small."""
+    __slots__ = ()
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+
+class BaseRecord(Record):
+    __slots__ = ('id', 'name', 'version', 'directory', 'architectures', 'packages', 'build_depends')
+
+    def __init__(self, id, name, version, directory):
+        self.id = id
+        self.name = name
+        self.version = version
+        self.directory = directory
+        self.architectures = ()
+        self.packages = ()
+        self.build_depends = ()
+
+
+class PackageRecord(Record):
+    __slots__ = ('id', 'name', 'base', 'virtual', 'provides')
+
+    def __init__(self, id, name, base, virtual):
+        self.id = id
+        self.name = name
+        self.base = base
+        self.virtual = virtual
+        self.provides = ()
+
+
+class RepositoryRecord(Record):
+    __slots__ = ('id', 'name', 'target', 'multilib', 'architectures', 'packages')
+
+    def __init__(self, id, name, target, multilib):
+        self.id = id
+        self.name = name
+        self.target = target
+        self.multilib = multilib
+        self.architectures = ()
+        self.packages = ()
+
+
+class Snapshot(Record):
+    """Read-only copy of the package graph, keyed by database ids.
+
+    Architectures are stored by name, everything else refers to other records by id. The version is the id of the
+    latest refresh, since only refreshes change the graph.
+    """
+    __slots__ = ('version', 'architectures', 'bases', 'packages', 'repositories')
+
+    def __init__(self, version, architectures, bases, packages, repositories):
+        self.version = version
+        self.architectures = architectures
+        self.bases = bases
+        self.packages = packages
+        self.repositories = repositories
+
+    @classmethod
+    def load(cls):
+        """Returns a snapshot of the database, in a fixed number of queries."""
+        architectures = dict(Architecture.objects.values_list('id', 'name'))
+        bases = {id: BaseRecord(id, name, version, str(Path(directory) / 'trunk' if official else Path(directory)))
+                 for id, name, version, directory, official
+                 in BasePackage.objects.values_list('id', 'name', 'version', 'base_directory', 'official')}
+        packages = {id: PackageRecord(id, name, base, virtual)
+                    for id, name, base, virtual in Package.objects.values_list('id', 'name', 'base_package', 'virtual')}
+        repositories = {id: RepositoryRecord(id, name, target, multilib) for id, name, target, multilib
+                        in Repository.objects.values_list('id', 'name', 'target', 'multilib')}
+        for records, attribute, through, owner, field in (
+                (bases, 'architectures', BasePackage.architectures.through, 'basepackage_id', 'architecture__name'),
+                (bases, 'build_depends', BasePackage.build_depends.through, 'basepackage_id', 'package_id'),
+                (packages, 'provides', Package.provides.through, 'from_package_id', 'to_package_id'),
+                (repositories, 'architectures', Repository.architectures.through, 'repository_id',
+                 'architecture__name'),
+                (repositories, 'packages', Repository.packages.through, 'repository_id', 'package_id')):
+            values = defaultdict(list)
+            for owner_id, value in through.objects.values_list(owner, field):
+                values[owner_id].append(value)
+            for owner_id, owned in values.items():
+                setattr(records[owner_id], attribute, tuple(owned))
+        for package in packages.values():
+            bases[package.base].packages += (package.id,)
+        version = Refresh.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        return cls(version, architectures, bases, packages, repositories)
+
+    def dumps(self):
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def is_any(self, base_id):
+        """Returns True if a base package is built for the any architecture."""
+        return 'any' in self.bases[base_id].architectures
+
+    def filename(self, package_id, architecture, version=None):
+        """Returns the file name of a package for an architecture name, like Package.filename."""
+        package = self.packages[package_id]
+        base = self.bases[package.base]
+        arch = architecture if architecture in base.architectures else 'any'
+        return f'{package.name}-{version or base.version}-{arch}.pkg.tar.xz'
+
+    def chbuild(self, repository_id, architecture):
+        """Returns the chroot target of a repository for an architecture name, like Repository.chbuild."""
+        repository = self.repositories[repository_id]
+        if repository.multilib:
+            return f'multilib-{repository.target}-build'
+        return f'{repository.target}-{architecture}-build'
+
+    def install_args(self, base_id, architecture, versions=None):
+        """Returns the makechrootpkg arguments installing the build dependencies of a base package.
+
+        versions maps base package ids to versions built since the snapshot was taken, like VCS packages.
+        """
+        versions = versions or {}
+        args = []
+        for package_id in self.bases[base_id].build_depends:
+            dep_base = self.bases[self.packages[package_id].base]
+            filename = self.filename(package_id, architecture, versions.get(dep_base.id))
+            args += ['-I', f'{dep_base.directory}/{filename}']
+        return args
+
+    def artifacts(self, base_id, architecture, version=None):
+        """Returns the paths of the packages of a version of a base package, the current one by default."""
+        base = self.bases[base_id]
+        return [Path(base.directory) / self.filename(package_id, architecture, version) for package_id in base.packages
+                if not self.packages[package_id].virtual]
+
+
+@lru_cache(maxsize=4)
+def batch_snapshot(batch_id):
+    """Returns the snapshot of a batch, loaded once per process."""
+    data = Batch.objects.filter(id=batch_id).values_list('snapshot', flat=True).first()
+    if data is None:
+        # Batches created before snapshots existed, and finished ones whose snapshot was dropped
+        return Snapshot.load()
+    return pickle.loads(bytes(data))
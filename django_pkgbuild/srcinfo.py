@@ -0,0 +1,117 @@
+import hashlib
+import re
+import subprocess
+from pathlib import Path
+
+VERSION_CONSTRAINT = re.compile(r'[<>=]')
+
+
+class SrcInfo:
+    """Parsed .SRCINFO, split into the pkgbase section and per pkgname overrides."""
+
+    def __init__(self):
+        self.pkgbase = {}
+        self.packages = {}
+
+    @property
+    def name(self):
+        return self.pkgbase.get('pkgbase', [None])[0]
+
+    @property
+    def version(self):
+        """Returns the full version string, including epoch and pkgrel."""
+        version = self.pkgbase.get('pkgver', [''])[0]
+        if 'pkgrel' in self.pkgbase:
+            version = f'{version}-{self.pkgbase["pkgrel"][0]}'
+        if self.pkgbase.get('epoch', [''])[0]:
+            version = f'{self.pkgbase["epoch"][0]}:{version}'
+        return version
+
+    def get(self, key, pkgname=None, default=()):
+        """Returns the values of a key, taking pkgname overrides into account."""
+        if pkgname is not None and key in self.packages[pkgname]:
+            return self.packages[pkgname][key]
+        return self.pkgbase.get(key, list(default))
+
+    def matching(self, *keys):
+        """Returns the pkgbase values of the keys, including their architecture specific variants."""
+        values = []
+        for key, value in self.pkgbase.items():
+            if key in keys or key.split('_', maxsplit=1)[0] in keys:
+                values.extend(value)
+        return values
+
+    def build_depends(self):
+        """Returns the names of the packages required to build, without version constraints."""
+        return [strip_constraint(value) for value in self.matching('depends', 'makedepends')]
+
+    def provides(self, pkgname):
+        """Returns the names provided by a package, without version constraints."""
+        return [strip_constraint(value) for value in self.get('provides', pkgname)]
+
+
+def strip_constraint(value):
+    """Removes the version constraint from a dependency."""
+    return VERSION_CONSTRAINT.split(value, maxsplit=1)[0]
+
+
+def parse(lines):
+    """Parses the lines of a .SRCINFO file."""
+    srcinfo = SrcInfo()
+    section = srcinfo.pkgbase
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        key, _, value = line.partition('=')
+        key = key.strip()
+        value = value.strip()
+        if key == 'pkgname':
+            section = srcinfo.packages.setdefault(value, {})
+            continue
+        values = section.setdefault(key, [])
+        # An empty value overrides a pkgbase array with an empty array
+        if value:
+            values.append(value)
+    return srcinfo
+
+
+def is_stale(directory):
+    """Returns True if the .SRCINFO file is missing or older than the PKGBUILD."""
+    path = Path(directory) / '.SRCINFO'
+    if not path.is_file():
+        return True
+    return path.stat().st_mtime < (Path(directory) / 'PKGBUILD').stat().st_mtime
+
+
+def generate_srcinfo(directory):
+    """Generates a .SRCINFO file with mksrcinfo."""
+    subprocess.run(['mksrcinfo'], cwd=directory)
+
+
+def read_srcinfo(directory):
+    """Parses the .SRCINFO file of a directory, generating it only if needed."""
+    if is_stale(directory):
+        generate_srcinfo(directory)
+    with open(Path(directory) / '.SRCINFO', 'r') as f:
+        return parse(f)
+
+
+def pkgbuild_hash(directory):
+    """Returns the SHA-256 digest of a PKGBUILD."""
+    with open(Path(directory) / 'PKGBUILD', 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def scan(directory, known_hash=None):
+    """Hashes a PKGBUILD and parses its .SRCINFO unless the hash is already known.
+
+    This does not touch the database, so it can run in a worker thread.
+    """
+    try:
+        digest = pkgbuild_hash(directory)
+        if digest == known_hash:
+            return digest, None
+        return digest, read_srcinfo(directory)
+    except PermissionError:
+        return None, None
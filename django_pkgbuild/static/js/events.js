@@ -0,0 +1,93 @@
+(function () {
+    'use strict';
+
+    var KINDS = ['queued', 'building', 'built', 'failed', 'skipped', 'published'];
+    // Latest event of each architecture, per row
+    var states = new WeakMap();
+    var logSource = null;
+
+    function rows(event) {
+        var selector = 'tr[data-base-package="' + event.base_package + '"][data-repository="' + event.repository + '"]';
+        return document.querySelectorAll(selector);
+    }
+
+    function showLog(build) {
+        var box = document.getElementById('build-log');
+        var pre = box.querySelector('pre');
+        if (logSource) {
+            logSource.close();
+        }
+        pre.textContent = '';
+        box.hidden = false;
+        logSource = new EventSource('builds/' + build + '/log/');
+        logSource.addEventListener('log', function (e) {
+            var follow = pre.scrollTop + pre.clientHeight >= pre.scrollHeight - 1;
+            pre.textContent += e.data + '\n';
+            if (follow) {
+                pre.scrollTop = pre.scrollHeight;
+            }
+        });
+        logSource.addEventListener('end', function () {
+            logSource.close();
+        });
+    }
+
+    function renderStatus(row) {
+        var cell = row.querySelector('.pkg-status');
+        var state = states.get(row);
+        cell.textContent = '';
+        Object.keys(state).sort().forEach(function (architecture) {
+            var event = state[architecture];
+            var item = document.createElement(event.kind === 'building' && event.build ? 'a' : 'span');
+            item.textContent = architecture + ' ' + event.kind + ' ';
+            if (item.tagName === 'A') {
+                item.href = '#build-log';
+                item.addEventListener('click', function () {
+                    showLog(event.build);
+                });
+            }
+            cell.appendChild(item);
+        });
+    }
+
+    function update(kind, event) {
+        Array.prototype.forEach.call(rows(event), function (row) {
+            var state = states.get(row) || {};
+            state[event.architecture] = {kind: kind, build: event.build};
+            states.set(row, state);
+            var building = Object.keys(state).some(function (architecture) {
+                return state[architecture].kind === 'building';
+            });
+            Array.prototype.forEach.call(row.querySelectorAll('button'), function (button) {
+                button.disabled = building;
+            });
+            var icon = row.querySelector('.fa-refresh');
+            if (icon) {
+                icon.classList.toggle('fa-spin', building);
+            }
+            if (kind === 'built') {
+                row.classList.remove('text-red');
+                if (event.version) {
+                    row.querySelector('.pkg-version').textContent = event.version;
+                }
+                if (event.finished) {
+                    row.querySelector('.pkg-date').textContent = new Date(event.finished).toLocaleDateString();
+                }
+            } else if (kind === 'failed') {
+                row.classList.add('text-red');
+            }
+            renderStatus(row);
+        });
+    }
+
+    if (!window.EventSource) {
+        return;
+    }
+    var since = document.currentScript.getAttribute('data-last-event');
+    var source = new EventSource('events/?since=' + since);
+    KINDS.forEach(function (kind) {
+        source.addEventListener(kind, function (e) {
+            update(kind, JSON.parse(e.data));
+        });
+    });
+})();
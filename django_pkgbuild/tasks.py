@@ -1,297 +1,586 @@
+import hashlib
 import os
-import shutil
 import subprocess
-from datetime import date
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
 
 from django.conf import settings
-from django.test import Client
-from django_q.tasks import async
-
-from .models import Architecture, BasePackage, Build, Package, Repository
-
-
-def parse_srcinfo(base_package):
-    """Generates and parses attributes from a .SRCINFO file."""
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+from django_q.models import Schedule
+
+from . import metrics
+from .agents import run_remote
+from .artifacts import publish_file
+from .chroots import build_command, chroot_directory, cleanup_chroots, prepare_chroot, remove_copy
+from .events import emit, prune_events
+from .graph import resolve_build_depends
+from .index import request_index
+from .models import Architecture, BasePackage, Build, BuildPhase, DatabaseUpdate, Event, Job, Package, Refresh, \
+    RefreshRequest, Repository
+from .phases import run_timed
+from .prefetch import fetch_sources, needing_sources, prefetch_enabled, start_prefetch
+from .repodb import update_repodb
+from .scheduler import finish_job, prioritize, schedule
+from .snapshot import Snapshot, batch_snapshot
+from .srcinfo import read_srcinfo, scan
+
+REFRESH_PENDING = 'django_pkgbuild.tasks.refresh_pending'
+REFRESH_HOOK = 'django_pkgbuild.tasks.refresh_pending_hook'
+
+
+def parse_srcinfo(base_package, srcinfo=None):
+    """Generates and parses attributes from a .SRCINFO file, unless it has already been parsed."""
     base_package.build_depends.clear()
     base_package.architectures.clear()
-    subprocess.run(['mksrcinfo'], cwd=base_package.directory())
-    path = base_package.directory() / '.SRCINFO'
-    with open(path, 'r') as f:
-        # Parse pkgbase info
-        line = f.readline()
-        item = line.strip().split(' = ')
-        base_provides = set()
-        while item[0] != 'pkgname':
-            if item[0] == 'pkgbase':
-                base_package.name = item[1]
-            elif item[0] == 'pkgver':
-                base_package.version = item[1]
-            elif item[0] == 'pkgrel':
-                base_package.version = f'{base_package.version}-{item[1]}'
-            elif item[0] == 'epoch':
-                base_package.version = f'{item[1]}:{base_package.version}'
-            elif item[0] == 'arch':
-                base_package.architectures.add(Architecture.objects.get_or_create(name=item[1])[0])
-            elif item[0] == 'makedepends':
-                # Use filter to avoid Package.DoesNotExist
-                base_package.build_depends.add(*Package.objects.filter(name=item[1], virtual=False))
-            elif item[0] == 'depends':
-                # Use filter to avoid Package.DoesNotExist
-                base_package.build_depends.add(*Package.objects.filter(name=item[1], virtual=False))
-            elif item[0] == 'provides':
-                provides = Package.objects.get_or_create(base_package=base_package, name=item[1], virtual=True)[0]
-                base_provides.add(provides)
-            line = f.readline()
-            item = line.strip().split(' = ')
-        # Parse pkgname info
-        while line:
-            if item[0] == 'pkgname':
-                pkg = Package.objects.get_or_create(base_package=base_package, name=item[1])[0]
-                pkg.provides.clear()
-                for provides in base_provides:
-                    pkg.provides.add(provides)
-            elif item[0] == 'provides':
-                provides = Package.objects.get_or_create(base_package=base_package, name=item[1], virtual=True)[0]
-                pkg.provides.add(provides)
-            line = f.readline()
-            item = line.strip().split(' = ')
+    if srcinfo is None:
+        srcinfo = read_srcinfo(base_package.directory())
+    # Parse pkgbase info
+    base_package.name = srcinfo.name
+    base_package.version = srcinfo.version
+    base_package.architectures.add(*[Architecture.objects.get_or_create(name=arch)[0]
+                                     for arch in srcinfo.get('arch')])
+    # Use filter to avoid Package.DoesNotExist, virtual packages are resolved by resolve_build_depends
+    base_package.build_depends.add(*Package.objects.filter(name__in=srcinfo.build_depends()))
+    # Parse pkgname info
+    for name in srcinfo.packages:
+        pkg = Package.objects.get_or_create(base_package=base_package, name=name)[0]
+        pkg.provides.clear()
+        for provides in srcinfo.provides(name):
+            pkg.provides.add(Package.objects.get_or_create(base_package=base_package, name=provides, virtual=True)[0])
     base_package.save()
-    # Add transitive build_depends
-    depends_count = 0
-    while depends_count != base_package.build_depends.count():
-        depends_count = base_package.build_depends.count()
-        for pkg in base_package.build_depends.all():
-            base_package.build_depends.add(*pkg.base_package.build_depends.all())
-    # Clean up build_depends
-    base_package.build_depends.remove(*Package.objects.filter(providers__in=base_package.build_depends.all()))
 
 
 def add_package_to_database(package, architecture, repository):
-    """Add a package to the specified repository database."""
+    """Copy a package to the specified repository and queue its addition to the database."""
     pkg_dir = package.base_package.directory()
     pkg_filename = package.filename(architecture)
     db_dir = repository.directory(architecture)
-    db_filename = repository.filename()
-    shutil.copy(pkg_dir / pkg_filename, db_dir)
-    if settings.PKGBUILD.get('delta', False):
-        subprocess.run(['repo-add', '-d', db_filename, pkg_filename], cwd=db_dir)
-    else:
-        subprocess.run(['repo-add', db_filename, pkg_filename], cwd=db_dir)
+    publish_file(pkg_dir / pkg_filename, db_dir)
+    DatabaseUpdate.objects.create(repository=repository, architecture=architecture, action=DatabaseUpdate.ADD,
+                                  name=package.name, filename=pkg_filename)
 
 
 def remove_package_from_database(package, architecture, repository):
-    """Remove a package from the specified repository database."""
-    pkg_name = package.name
-    db_dir = repository.directory(architecture)
-    db_filename = repository.filename()
-    subprocess.run(['repo-remove', db_filename, pkg_name], cwd=db_dir)
+    """Queue the removal of a package from the specified repository database."""
+    DatabaseUpdate.objects.create(repository=repository, architecture=architecture, action=DatabaseUpdate.REMOVE,
+                                  name=package.name)
 
 
-def check_bzr(base_package):
-    """Check if a new bazaar commit exists."""
-    if 'srcdest' in settings.PKGBUILD:
-        bzr_root = Path(settings.PKGBUILD['srcdest']) / base_package.name.rsplit('-', maxsplit=1)[0]
-    else:
-        bzr_root = base_package.directory() / base_package.name.rsplit('-', maxsplit=1)[0]
-    behind = False
-    if bzr_root.is_dir():
-        old = subprocess.run(['bzr', 'revno'], cwd=bzr_root, stdout=subprocess.PIPE).stdout
-        print(old)
-        subprocess.run(['bzr', 'pull'], cwd=bzr_root, stdout=subprocess.DEVNULL)
-        new = subprocess.run(['bzr', 'revno'], cwd=bzr_root, stdout=subprocess.PIPE).stdout
-        print(new)
-        behind = new != old
-    return behind
-
-
-def check_git(base_package):
-    """Check if a new git commit exists."""
-    if 'srcdest' in settings.PKGBUILD:
-        git_root = Path(settings.PKGBUILD['srcdest']) / base_package.name.rsplit('-', maxsplit=1)[0]
-    else:
-        git_root = base_package.directory() / base_package.name.rsplit('-', maxsplit=1)[0]
-    behind = False
-    if git_root.is_dir():
-        old = subprocess.run(['git', 'rev-list', '--count', 'HEAD'], cwd=git_root, stdout=subprocess.PIPE).stdout
-        print(old)
-        subprocess.run(['git', 'fetch', '--all', '-p'], cwd=git_root, stdout=subprocess.DEVNULL)
-        new = subprocess.run(['git', 'rev-list', '--count', 'HEAD'], cwd=git_root, stdout=subprocess.PIPE).stdout
-        print(new)
-        behind = new != old
-    return behind
-
-
-def check_hg(base_package):
-    """Check if a new mercurial commit exists."""
-    if 'srcdest' in settings.PKGBUILD:
-        hg_root = Path(settings.PKGBUILD['srcdest']) / base_package.name.rsplit('-', maxsplit=1)[0]
-    else:
-        hg_root = base_package.directory() / base_package.name.rsplit('-', maxsplit=1)[0]
-    behind = False
-    if hg_root.is_dir():
-        old = subprocess.run(['hg', 'id', '-n'], cwd=hg_root, stdout=subprocess.PIPE).stdout
-        print(old)
-        subprocess.run(['hg', 'pull'], cwd=hg_root, stdout=subprocess.DEVNULL)
-        new = subprocess.run(['hg', 'id', '-n'], cwd=hg_root, stdout=subprocess.PIPE).stdout
-        print(new)
-        behind = new != old
-    return behind
-
-
-def check_svn(base_package):
-    """Check if a new subversion commit exists."""
-    if 'srcdest' in settings.PKGBUILD:
-        svn_root = Path(settings.PKGBUILD['srcdest']) / base_package.name.rsplit('-', maxsplit=1)[0]
+def update_database(repository, architecture):
+    """Apply the queued updates of a repository database with a single repo-remove and repo-add, or natively."""
+    db_dir = repository.directory(architecture)
+    db_filename = repository.filename()
+    with transaction.atomic():
+        updates = list(DatabaseUpdate.objects.select_for_update()
+                       .filter(repository=repository, architecture=architecture).order_by('id'))
+        # The last update of a package wins
+        latest = {update.name: update for update in updates}
+        removes = [update.name for update in latest.values() if update.action == DatabaseUpdate.REMOVE]
+        adds = [update.filename for update in latest.values() if update.action == DatabaseUpdate.ADD]
+        with metrics.Timer('pkgbuild_repo_add_duration_seconds', {'repository': repository.name,
+                                                                  'architecture': architecture.name}):
+            # repo-add is still needed to generate deltas
+            if settings.PKGBUILD.get('repo_db', 'repo-add') == 'native' and not settings.PKGBUILD.get('delta', False):
+                if removes or adds:
+                    update_repodb(db_dir, repository.name, removes, adds)
+            else:
+                if removes:
+                    subprocess.run(['repo-remove', db_filename, *removes], cwd=db_dir)
+                if adds:
+                    if settings.PKGBUILD.get('delta', False):
+                        subprocess.run(['repo-add', '-d', db_filename, *adds], cwd=db_dir)
+                    else:
+                        subprocess.run(['repo-add', db_filename, *adds], cwd=db_dir)
+        DatabaseUpdate.objects.filter(id__in=[update.id for update in updates]).delete()
+
+
+def update_databases():
+    """Apply the queued updates of every repository database."""
+    pairs = DatabaseUpdate.objects.values_list('repository', 'architecture').distinct()
+    for repo_id, arch_id in pairs:
+        update_database(Repository.objects.get(id=repo_id), Architecture.objects.get(id=arch_id))
+
+
+def build_key(base_package, architecture, repository, revision=None):
+    """Returns a hash of everything a build depends on.
+
+    That is the PKGBUILD and its local files, the VCS revision, the build dependencies and the chroot target.
+    """
+    key = hashlib.sha256()
+    directory = base_package.directory()
+    srcinfo = read_srcinfo(directory)
+    # Remote sources are covered by the checksums in the PKGBUILD
+    local_files = [source.split('::')[-1] for source in srcinfo.matching('source') if '://' not in source]
+    for filename in ['PKGBUILD', *srcinfo.get('install'), *srcinfo.get('changelog'), *sorted(local_files)]:
+        path = directory / filename
+        if path.is_file():
+            key.update(filename.encode())
+            with open(path, 'rb') as f:
+                key.update(hashlib.sha256(f.read()).digest())
+    key.update(f'{revision}\0{repository.chbuild(architecture)}'.encode())
+    for pkg in base_package.build_depends.select_related('base_package').order_by('name'):
+        dep_build = pkg.base_package.build_history.filter(architecture__name__in=[architecture.name, 'any'],
+                                                          status=0).last()
+        key.update(f'{pkg.name}={dep_build.key if dep_build else pkg.base_package.version}\0'.encode())
+    return key.hexdigest()
+
+
+def artifacts_exist(base_package, architecture, snapshot):
+    """Returns True if the packages of the current version are in the PKGBUILD directory."""
+    return all(path.is_file() for path in snapshot.artifacts(base_package.id, architecture.name, base_package.version))
+
+
+def logs_root():
+    return Path(settings.PKGBUILD.get('logs_root', Path(settings.PKGBUILD['repositories_root']) / 'logs'))
+
+
+def log_path(build):
+    """Returns the path of a build log."""
+    return logs_root() / f'{build.base_package.name}-{build.architecture.name}-{build.id}.log'
+
+
+def sources_log_path(job):
+    """Returns the path of the log of fetching the sources of a job."""
+    return logs_root() / f'{job.package.base_package.name}-{job.architecture.name}-job{job.id}-sources.log'
+
+
+def run_build(base_package, architecture, repository, build_architecture, snapshot, revision=None, versions=None,
+              batch_id=None, job_id=None):
+    """Run archbuild, timing each phase of the build.
+
+    versions maps base package ids to the versions built since the snapshot was taken. With warm chroots, builds of a
+    batch share a root chroot updated once, and run makechrootpkg in a throwaway copy of it. The job running the build
+    is linked to it as soon as it starts, which tells log streams it is still alive.
+    """
+    build = Build.objects.create(base_package=base_package, version=base_package.version,
+                                 architecture=build_architecture, target=repository.target, revision=revision,
+                                 started=timezone.now())
+    if job_id is not None:
+        Job.objects.filter(id=job_id).update(build=build)
+    Event.objects.create(kind=Event.BUILDING, base_package=base_package, architecture=architecture,
+                         repository=repository, build=build)
+    cmd = ['sudo', snapshot.chbuild(repository.id, architecture.name)]
+    install_args = snapshot.install_args(base_package.id, architecture.name, versions)
+    if install_args:
+        cmd += ['--', *install_args]
+    path = log_path(build)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as log:
+        if settings.PKGBUILD.get('agents'):
+            build.status, durations = run_remote(settings.PKGBUILD['agents'], cmd[1], architecture.name,
+                                                 base_package.name, base_package.directory(), install_args[1::2], log,
+                                                 settings.PKGBUILD.get('agents_secret'))
+        elif settings.PKGBUILD.get('warm_chroots', False) and batch_id is not None:
+            build.status, durations = run_warm_build(cmd[1], install_args, batch_id, build, base_package.directory(),
+                                                     log)
+        else:
+            build.status, durations = run_timed(cmd, base_package.directory(), log,
+                                                echo=settings.PKGBUILD.get('debug', False))
+    build.finished = timezone.now()
+    metrics.observe('pkgbuild_build_duration_seconds', {'repository': repository.name,
+                                                        'architecture': architecture.name}, build.duration())
+    if build.status:
+        base_package.builds = False
     else:
-        svn_root = base_package.directory() / base_package.name.rsplit('-', maxsplit=1)[0]
-    behind = False
-    if svn_root.is_dir():
-        old = subprocess.run(['svnversion'], cwd=svn_root, stdout=subprocess.PIPE).stdout
-        print(old)
-        subprocess.run(['svn', 'up'], cwd=svn_root, stdout=subprocess.DEVNULL)
-        new = subprocess.run(['svnversion'], cwd=svn_root, stdout=subprocess.PIPE).stdout
-        print(new)
-        behind = new != old
-    return behind
-
-
-def build_package(package, architecture, repository, force=False):
-    """Build a package for the specified architecture and repository."""
+        base_package.builds = True
+        # The PKGBUILD of VCS packages is updated by the build, which only changes their version, so the dependency
+        # graph is left to refreshes rather than rewritten by concurrent builds
+        base_package.version = read_srcinfo(base_package.directory()).version
+        build.version = base_package.version
+        build.key = build_key(base_package, architecture, repository, revision)
+        # A failed probe does not make a VCS package any less of one
+        if revision is not None:
+            base_package.vcs_revision = revision
+    build.save()
+    BuildPhase.objects.bulk_create([BuildPhase(build=build, name=name, duration=duration)
+                                    for name, duration in durations.items()])
+    return build
+
+
+def run_warm_build(chbuild, install_args, batch_id, build, directory, log):
+    """Build in a copy of the root chroot prepared for a batch, and return the exit status and phase durations."""
+    start = time.monotonic()
+    if not prepare_chroot(batch_id, chbuild, log):
+        log.write(f'==> ERROR: Could not prepare the {chbuild} chroot\n'.encode())
+        return 1, {'chroot': time.monotonic() - start}
+    # Waiting for the chroot of the batch is part of setting it up
+    prepared = time.monotonic() - start
+    copy = f'batch{batch_id}-build{build.id}'
+    status, durations = run_timed(build_command(chbuild, copy, install_args), directory, log,
+                                  echo=settings.PKGBUILD.get('debug', False))
+    durations['chroot'] = durations.get('chroot', 0) + prepared
+    remove_copy(chroot_directory(chbuild) / copy)
+    return status, durations
+
+
+def build_package(package, architecture, repository, force=False, revision=None, rebuild=False, snapshot=None,
+                  versions=None, batch_id=None, job_id=None):
+    """Build a package for the specified architecture and repository, and return the build of its artifacts.
+
+    VCS packages are also rebuilt when revision, their remote revision probed when scheduling, differs from the one of
+    their last build. Unless rebuild is True, existing artifacts are reused when their build key shows none of the
+    build inputs changed. Without a snapshot of the package graph, a fresh one is loaded.
+    """
     base_pkg = package.base_package
-    any_pkg = base_pkg.architectures.filter(name='any').exists()
+    if snapshot is None:
+        snapshot = Snapshot.load()
+    any_pkg = snapshot.is_any(base_pkg.id)
     any_arch = Architecture.objects.get_or_create(name='any')[0]
     base_pkg.building = True
     base_pkg.save()
-    build = Build.objects.filter(base_package=base_pkg,
-                                 version=base_pkg.version,
-                                 architecture=any_arch if any_pkg else architecture,
-                                 target=repository.target)
-    vcs_behind = (base_pkg.name.endswith('-bzr') and check_bzr(base_pkg) or
-                  base_pkg.name.endswith('-git') and check_git(base_pkg) or
-                  base_pkg.name.endswith('-hg') and check_hg(base_pkg) or
-                  base_pkg.name.endswith('-svn') and check_svn(base_pkg))
-    print(force)
-    print(vcs_behind)
-    print(build)
-    if force or vcs_behind or not build.exists():
-        cmd = ['sudo', repository.chbuild(architecture)]
-        if base_pkg.build_depends.count():
-            cmd.append('--')
-            for pkg in base_pkg.build_depends.all():
-                cmd.append('-I')
-                cmd.append(f'{pkg.base_package.directory()}/{pkg.filename(architecture)}')
-        if settings.PKGBUILD.get('debug', False):
-            proc = subprocess.run(cmd, cwd=base_pkg.directory())
-        else:
-            proc = subprocess.run(cmd, cwd=base_pkg.directory(), stdout=subprocess.DEVNULL)
-        if proc.returncode:
-            base_pkg.builds = False
-        else:
+    try:
+        builds = Build.objects.filter(base_package=base_pkg,
+                                      architecture=any_arch if any_pkg else architecture,
+                                      target=repository.target,
+                                      status=0)
+        build = builds.filter(version=base_pkg.version)
+        last_build = builds.last()
+        vcs_behind = revision is not None and (last_build is None or last_build.revision != revision)
+        cached = build.filter(key=build_key(base_pkg, architecture, repository, revision)).last()
+        if cached and artifacts_exist(base_pkg, architecture, snapshot) and not rebuild:
             base_pkg.builds = True
-            parse_srcinfo(base_pkg)
-            build = Build.objects.get_or_create(base_package=base_pkg,
-                                                version=base_pkg.version,
-                                                architecture=any_arch if any_pkg else architecture)[0]
-            build.target = repository.target
-            build.date = date.today()
-            build.save()
-    base_pkg.building = False
-    base_pkg.save()
+            build = cached
+        elif force or rebuild or vcs_behind or not build.exists():
+            build = run_build(base_pkg, architecture, repository, any_arch if any_pkg else architecture, snapshot,
+                              revision, versions, batch_id, job_id)
+        else:
+            build = build.last()
+    finally:
+        # Never leave the package shown as building when the build raised
+        base_pkg.building = False
+        base_pkg.save()
+    return build
+
+
+def build_job(job_id):
+    """Build the package of a scheduled job."""
+    job = Job.objects.select_related('package__base_package', 'architecture', 'repository').get(id=job_id)
+    job.state = Job.BUILDING
+    job.save()
+    metrics.inc('pkgbuild_builds_in_progress', {'repository': job.repository.name,
+                                                'architecture': job.architecture.name})
+    # Packages built earlier in the batch, VCS ones may have a newer version than in the snapshot
+    versions = dict(Job.objects.filter(batch=job.batch_id, build__status=0)
+                    .values_list('package__base_package', 'build__version'))
+    if prefetch_enabled():
+        # Download the sources of the next jobs while this one builds
+        start_prefetch(job)
+        if needing_sources(Job.objects.filter(id=job.id)).exists() and \
+                not fetch_sources(job, sources_log_path(job)):
+            return False
+    job.build = build_package(job.package, job.architecture, job.repository, job.force, job.revision, job.rebuild,
+                              batch_snapshot(job.batch_id), versions, job.batch_id, job.id)
+    job.save()
+    return job.build.status == 0
+
+
+def build_package_repo(package, repository, force=False, rebuild=False):
+    """Build a package for the specified repository, ahead of nightly and dependency builds.
+
+    If the package is already waiting to be built for the repository, that job is moved ahead instead.
+    """
+    waiting = Job.objects.filter(publications__package=package, publications__repository=repository,
+                                 state__in=(Job.PENDING, Job.READY)).distinct()
+    if not waiting.exists():
+        return schedule([(package, repository)], force, rebuild, priority=Job.INTERACTIVE)
+    if force:
+        waiting.update(force=True)
+    if rebuild:
+        waiting.update(rebuild=True)
+    prioritize(Job.objects.filter(id__in=waiting.values_list('id', flat=True)))
+    return waiting.first().batch
+
+
+def build_packages_repo(repository, force=False, rebuild=False):
+    """Build all packages from the specified repository, dependencies first."""
+    return schedule([(pkg, repository) for pkg in repository.packages.select_related('base_package')], force, rebuild)
+
+
+def build_packages(force=False, rebuild=False):
+    """Build packages from all repositories, dependencies first."""
+    return schedule([(pkg, repo) for repo in Repository.objects.all()
+                     for pkg in repo.packages.select_related('base_package')], force, rebuild)
+
+
+def changed_packages(base_ids):
+    """Returns the base packages among base_ids whose current version was never built."""
+    builds = Build.objects.filter(base_package=OuterRef('pk'), version=OuterRef('version'), status=0)
+    return BasePackage.objects.filter(id__in=base_ids).annotate(built=Exists(builds)).filter(built=False)
+
+
+def build_changed_packages(base_ids, nightly=False):
+    """Build the packages whose version changed, and rebuild the packages depending on them, dependencies first.
+
+    Nightly, the packages of repositories whose current version was never built, like new ones, and the ones built from
+    VCS sources, whose remote may have moved, are built too.
+    """
+    vcs = set()
+    if nightly:
+        in_repos = BasePackage.objects.filter(packages__repository__isnull=False).distinct()
+        base_ids = set(base_ids) | set(in_repos.values_list('id', flat=True))
+        # Probed when they build, they are only rebuilt if their remote moved
+        vcs = set(in_repos.filter(vcs_revision__isnull=False).values_list('id', flat=True))
+    changed = set(changed_packages(base_ids).values_list('id', flat=True))
+    # build_depends holds the transitive closure, so this covers indirect dependents too
+    dependents = set(BasePackage.objects.filter(build_depends__base_package__in=changed)
+                     .values_list('id', flat=True)) - changed
+    targets = [(pkg, repo) for repo in Repository.objects.filter(packages__base_package__in=changed | dependents | vcs)
+               .distinct() for pkg in repo.packages.filter(base_package__in=changed | dependents | vcs)
+               .select_related('base_package')]
+    if not targets:
+        return None
+    return schedule(targets, rebuilds=dependents, priority=Job.DEPENDENCY)
 
 
-def build_package_repo(package, repository, force=False):
-    """Build a package for the specified repository."""
-    name = package.name
-    version = package.base_package.version
-    for arch in repository.architectures.all():
-        task_name = f'{name}-{version}-{repository.target}-{arch}'
-        async(build_package, package, arch, repository, force,
-              group=repository.name, task_name=task_name, hook=build_package_hook)
+def find_pkgbuild(root):
+    """Look for a PKGBUILD and return its base directory and True if the package is official."""
+    # Try unofficial package
+    if (root / 'PKGBUILD').is_file():
+        return root, False
+    # Try official package
+    if (root / 'trunk' / 'PKGBUILD').is_file():
+        return root, True
+    return None, False
 
 
-def build_packages_repo(repository, force=False):
-    """Build all packages from the specified repository."""
-    for pkg in sorted(repository.packages.all()):
-        for arch in repository.architectures.all():
-            task_name = f'{pkg.name}-{pkg.base_package.version}-{repository.target}-{arch}'
-            async(build_package, pkg, arch, repository, force,
-                  group=repository.name, task_name=task_name, hook=build_package_hook)
+def find_pkgbuilds(root):
+    """Look for PKGBUILDs up to a depth of 2."""
+    # Ignore hidden directories
+    for fldir in [Path(d.path) for d in os.scandir(root) if d.is_dir() and not d.name.startswith('.')]:
+        try:
+            directory, official = find_pkgbuild(fldir)
+            if directory:
+                yield directory, official
+            if official:
+                # Continue if official so trunk doesn't get scanned
+                continue
+            second_level = os.scandir(fldir)
+        except PermissionError:
+            continue
+        for sldir in [Path(d.path) for d in second_level if d.is_dir() and not d.name.startswith('.')]:
+            try:
+                directory, official = find_pkgbuild(sldir)
+            except PermissionError:
+                continue
+            if directory:
+                yield directory, official
 
 
-def build_packages(force=False):
-    """Build packages from all repositories."""
-    for repo in Repository.objects.all():
-        build_packages_repo(repo, force)
+def git_revision(root):
+    """Returns the current git commit, or None if it cannot be determined."""
+    proc = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, universal_newlines=True)
+    return None if proc.returncode else proc.stdout.strip()
 
 
-def generate_index():
-    """Generate a static index."""
-    c = Client()
-    with open(Path(settings.PKGBUILD['repositories_root']) / 'index.html', 'wb') as f:
-        f.write(c.get('/').content)
+def changed_directories(root, old, new):
+    """Returns the directories changed between two git commits, or None if the diff failed."""
+    proc = subprocess.run(['git', 'diff', '--name-only', old, new], cwd=root, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, universal_newlines=True)
+    if proc.returncode:
+        return None
+    return package_directories(root, proc.stdout.splitlines())
 
 
-def find_pkgbuild(root):
-    """Look for a PKGBUILD and return True if the package is official."""
-    path = root / 'PKGBUILD'
-    # Try unofficial package
-    if path.is_file():
-        base_pkg = BasePackage.objects.get_or_create(base_directory=path.parent)[0]
-        parse_srcinfo(base_pkg)
+def package_directories(root, paths):
+    """Returns the directories which may hold the PKGBUILD of changed paths, relative to root or absolute."""
+    directories = set()
+    for path in paths:
+        path = Path(path)
+        if path.is_absolute():
+            try:
+                path = path.relative_to(root)
+            except ValueError:
+                continue
+        parts = path.parts
+        if len(parts) < 2 or parts[0].startswith('.'):
+            continue
+        directories.add(root / parts[0])
+        # Limit depth to 2 and skip the trunk of official packages, like find_pkgbuilds
+        if len(parts) > 2 and not parts[1].startswith('.') and not (root / parts[0] / 'trunk' / 'PKGBUILD').is_file():
+            directories.add(root.joinpath(*parts[:2]))
+    return directories
+
+
+def scan_pkgbuilds(pkgbuilds, full=False):
+    """Hash and parse PKGBUILDs in a pool of threads.
+
+    The work is spent in makepkg and reading files, and threads also run in Django Q workers, which as daemonic
+    processes cannot have children.
+    """
+    pkgbuilds = list(pkgbuilds)
+    hashes = {} if full else dict(BasePackage.objects.values_list('base_directory', 'pkgbuild_hash'))
+    directories = [directory / 'trunk' if official else directory for directory, official in pkgbuilds]
+    known_hashes = [hashes.get(str(directory)) for directory, official in pkgbuilds]
+    workers = settings.PKGBUILD.get('scan_workers', os.cpu_count())
+    if workers > 1 and len(pkgbuilds) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            yield from zip(pkgbuilds, executor.map(scan, directories, known_hashes))
     else:
-        # Try official package
-        path = root / 'trunk' / 'PKGBUILD'
-        if path.is_file():
-            base_pkg = BasePackage.objects.get_or_create(base_directory=path.parent.parent,
-                                                         official=True)[0]
-            parse_srcinfo(base_pkg)
-            return True
-    return False
+        yield from zip(pkgbuilds, map(scan, directories, known_hashes))
+
+
+def timed_parse_srcinfo(base_package, srcinfo, durations):
+    """Parse a base package, appending the duration to durations."""
+    start = time.monotonic()
+    parse_srcinfo(base_package, srcinfo)
+    durations.append(time.monotonic() - start)
+
+
+def refresh_package(directory, official, digest, srcinfo, durations):
+    """Create or update a base package from its scan results, returning it if it was parsed."""
+    base_pkg = BasePackage.objects.get_or_create(base_directory=directory, defaults={'official': official})[0]
+    if srcinfo is None:
+        return None
+    base_pkg.official = official
+    base_pkg.pkgbuild_hash = digest
+    timed_parse_srcinfo(base_pkg, srcinfo, durations)
+    return base_pkg
+
+
+def refresh_packages(full=False, paths=None):
+    """Refresh packages from git, only parsing changed PKGBUILDs unless full is True.
+
+    If paths are given, only the packages they belong to are refreshed, without pulling.
+    """
+    with metrics.Timer('pkgbuild_refresh_duration_seconds'):
+        return _refresh_packages(full, paths)
 
 
-def refresh_packages():
-    """Refresh packages from git."""
+def _refresh_packages(full, paths):
     root = Path(settings.PKGBUILD['packages_root'])
     git_dir = root / '.git'
-    if git_dir.is_dir():
+    revision = None
+    directories = None
+    if paths is not None:
+        directories = package_directories(root, paths)
+    elif git_dir.is_dir():
         subprocess.run(['git', 'pull'], cwd=root)
-    # Limit depth to 2
-    first_level = os.scandir(root)
-    # Ignore hidden directories
-    for fldir in [d for d in first_level if d.is_dir() and not d.name.startswith('.')]:
-        try:
-            if find_pkgbuild(root / fldir):
-                # Continue if official so trunk doesn't get scanned
-                continue
-        except PermissionError:
-            pass
-        second_level = os.scandir(fldir)
-        for sldir in [d for d in second_level if d.is_dir() and not d.name.startswith('.')]:
-            try:
-                find_pkgbuild(root / fldir / sldir)
-            except PermissionError:
-                pass
-    # Second pass to resolve build_depends and delete old packages
-    for base_pkg in BasePackage.objects.all():
+        revision = git_revision(root)
+        last_refresh = Refresh.objects.filter(revision__isnull=False).last()
+        if not full and revision and last_refresh:
+            directories = changed_directories(root, last_refresh.revision, revision)
+    if directories is None:
+        pkgbuilds = find_pkgbuilds(root)
+    else:
+        pkgbuilds = [(d, official) for d, official in map(find_pkgbuild, directories) if d]
+    last_package = Package.objects.filter(virtual=False).aggregate(Max('id'))['id__max'] or 0
+    # Parse in parallel, then write to the database from this thread only
+    srcinfos = {}
+    durations = []
+    for (directory, official), (digest, srcinfo) in scan_pkgbuilds(pkgbuilds, full):
+        if digest is None:
+            continue
+        base_pkg = refresh_package(directory, official, digest, srcinfo, durations)
+        if base_pkg:
+            srcinfos[base_pkg.id] = srcinfo
+    refreshed = set(srcinfos)
+    # Delete old packages, only the changed directories can have lost their PKGBUILD
+    base_pkgs = BasePackage.objects.all()
+    if directories is not None:
+        base_pkgs = base_pkgs.filter(base_directory__in=[str(directory) for directory in directories])
+    for base_pkg in base_pkgs:
         path = base_pkg.directory() / 'PKGBUILD'
-        if path.is_file():
-            parse_srcinfo(base_pkg)
-        else:
+        if not path.is_file():
+            refreshed.update(BasePackage.objects.filter(build_depends__base_package=base_pkg)
+                             .values_list('id', flat=True))
+            refreshed.discard(base_pkg.id)
             base_pkg.delete()
+    # Second pass to resolve build_depends of refreshed packages and the packages depending on them,
+    # or of every package if new packages may satisfy previously unresolved dependencies
+    if Package.objects.filter(virtual=False, id__gt=last_package).exists():
+        second_pass = BasePackage.objects.all()
+    else:
+        second_pass = BasePackage.objects.filter(Q(id__in=refreshed) |
+                                                 Q(build_depends__base_package__in=refreshed)).distinct()
+    for base_pkg in second_pass:
+        timed_parse_srcinfo(base_pkg, srcinfos.get(base_pkg.id), durations)
+    # Observe once rather than for every package
+    metrics.observe('pkgbuild_parse_srcinfo_duration_seconds', {}, *durations)
+    resolve_build_depends()
+    Refresh.objects.create(revision=revision)
+    return sorted(refreshed)
+
+
+def request_refresh(paths):
+    """Schedule a refresh of the packages of changed paths, merging the requests made until it runs."""
+    with transaction.atomic():
+        RefreshRequest.objects.bulk_create([RefreshRequest(path=str(path)) for path in paths])
+        # Django Q deletes run ONCE schedules, or sets their repeats to 0
+        if Schedule.objects.filter(func=REFRESH_PENDING, schedule_type=Schedule.ONCE).exclude(repeats=0).exists():
+            return
+        delay = settings.PKGBUILD.get('refresh_delay', 10)
+        Schedule.objects.create(name='Partial Refresh', func=REFRESH_PENDING, hook=REFRESH_HOOK,
+                                schedule_type=Schedule.ONCE, repeats=-1,
+                                next_run=timezone.now() + timedelta(seconds=delay))
+
+
+def refresh_pending():
+    """Refresh the packages of the paths requested so far.
+
+    Requests made during the refresh are left to the next one, which they schedule.
+    """
+    requests = list(RefreshRequest.objects.values_list('id', 'path'))
+    if not requests:
+        return []
+    refreshed = refresh_packages(paths={path for id, path in requests})
+    # Requests are kept for the next refresh if this one fails
+    RefreshRequest.objects.filter(id__in=[id for id, path in requests]).delete()
+    return refreshed
+
+
+def build_job_hook(task):
+    job = Job.objects.select_related('package__base_package', 'architecture', 'repository', 'batch') \
+        .get(id=task.args[0])
+    success = task.success and bool(task.result)
+    try:
+        emit(Event.BUILT if success else Event.FAILED, [job], job.build_id)
+        labels = {'repository': job.repository.name, 'architecture': job.architecture.name}
+        metrics.dec('pkgbuild_builds_in_progress', labels)
+        metrics.inc('pkgbuild_builds_total', {**labels, 'result': 'succeeded' if success else 'failed'})
+        if success:
+            start = time.monotonic()
+            # A single build is published to every repository and architecture that needs it
+            for publication in job.publications.select_related('package__base_package', 'repository',
+                                                               'architecture'):
+                add_package_to_database(publication.package, publication.architecture, publication.repository)
+            # Builds reused by later jobs keep the publish phase of the job which ran them
+            if not job.build.phases.filter(name='publish').exists():
+                BuildPhase.objects.create(build=job.build, name='publish', duration=time.monotonic() - start)
+            emit(Event.PUBLISHED, job.publications.select_related('package'), job.build_id)
+            metrics.set_gauge('pkgbuild_last_success_timestamp_seconds', {'package': job.package.base_package.name},
+                              job.build.finished.timestamp() if job.build.finished else time.time())
+    except Exception:
+        success = False
+        raise
+    finally:
+        # Django Q only logs the exceptions of hooks, a job left building would hold its slot and its batch forever
+        finish_job(job, success)
+        if job.batch.finished:
+            update_databases()
+            if settings.PKGBUILD.get('warm_chroots', False):
+                cleanup_chroots(job.batch)
+            prune_events()
+        if settings.PKGBUILD.get('static', False):
+            request_index()
 
 
-def build_package_hook(task):
-    pkg = task.args[0]
-    arch = task.args[1]
-    repo = task.args[2]
-    if pkg.base_package.builds:
-        add_package_to_database(pkg, arch, repo)
+def refresh_packages_hook(task):
+    if settings.PKGBUILD.get('refresh_builds', 'changed') == 'all':
+        build_packages()
+    elif task.success:
+        build_changed_packages(task.result, nightly=True)
     if settings.PKGBUILD.get('static', False):
-        generate_index()
+        request_index()
 
 
-def refresh_packages_hook(task):
-    build_packages()
+def refresh_pending_hook(task):
+    """Build the packages changed by a partial refresh, refresh_builds only applies to full ones."""
+    if task.success:
+        build_changed_packages(task.result)
     if settings.PKGBUILD.get('static', False):
-        generate_index()
+        request_index()
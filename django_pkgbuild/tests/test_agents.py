@@ -0,0 +1,123 @@
+import io
+import multiprocessing
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from django_pkgbuild.agents import Agent, Coordinator, Request, connect, receive, run_remote, send
+
+SECRET = 'secret'
+# Stands in for archbuild, which receives the chroot target and the dependencies to install as arguments
+BUILD = ['sh', '-c', 'echo "==> Starting build()"; ls deps; echo package > "${PWD##*/}-1-1-x86_64.pkg.tar.xz"; '
+         'echo pkgver=2 >> PKGBUILD', 'sh']
+
+
+def run_agent(address, name, workdir):
+    Agent(address, name, ['x86_64'], ['extra-x86_64-build'], workdir, BUILD, SECRET).run()
+
+
+class AgentsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.address = f'unix:{self.root}/coordinator.sock'
+
+    def test_remote_builds(self):
+        server = Coordinator(secret=SECRET).server(self.address)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        agents = [multiprocessing.Process(target=run_agent, args=(self.address, f'agent{i}', self.root / f'agent{i}'),
+                                          daemon=True) for i in range(2)]
+        for agent in agents:
+            agent.start()
+            self.addCleanup(agent.terminate)
+
+        dependency = self.root / 'test-dependency-1-1-x86_64.pkg.tar.xz'
+        dependency.write_bytes(b'dependency')
+        results = {}
+
+        def build(name):
+            directory = self.root / name
+            directory.mkdir()
+            (directory / 'PKGBUILD').write_text(f'pkgname={name}\n')
+            log = tempfile.TemporaryFile()
+            status, durations = run_remote(self.address, 'extra-x86_64-build', 'x86_64', name, directory,
+                                           [dependency], log, SECRET)
+            log.seek(0)
+            results[name] = status, durations, log.read()
+
+        threads = [threading.Thread(target=build, args=(name,)) for name in ('test-package', 'test-other-package')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        for name in ('test-package', 'test-other-package'):
+            status, durations, log = results[name]
+            self.assertEqual(status, 0)
+            self.assertIn('compile', durations)
+            self.assertIn(dependency.name.encode(), log)
+            # The directory on the agent is named after the chroot target
+            self.assertTrue((self.root / name / 'extra-x86_64-build-1-1-x86_64.pkg.tar.xz').is_file())
+            # Like pkgver() of VCS packages
+            self.assertEqual((self.root / name / 'PKGBUILD').read_text(), f'pkgname={name}\npkgver=2\n')
+
+        with connect(self.address, SECRET) as sock:
+            send(sock, {'type': 'status'})
+            status = receive(sock)[0]
+        self.assertEqual(status['capacity'], {'agent0': 1, 'agent1': 1})
+
+        with connect(self.address, 'wrong') as sock:
+            send(sock, {'type': 'status'})
+            with self.assertRaises(ConnectionError):
+                receive(sock)
+
+    def test_unreachable_coordinator(self):
+        directory = self.root / 'test-package'
+        directory.mkdir()
+        log = io.BytesIO()
+
+        # No coordinator listens there, the build fails rather than raising
+        self.assertEqual(run_remote(self.address, 'extra-x86_64-build', 'x86_64', 'test-package', directory, [], log,
+                                    SECRET), (1, {}))
+        self.assertIn(b'ERROR', log.getvalue())
+
+    def test_secret_required(self):
+        with self.assertRaises(ValueError):
+            Coordinator().server('0.0.0.0:0')
+        Coordinator().server('localhost:0').server_close()
+
+    def test_pick_warm_agent(self):
+        coordinator = Coordinator(warm_wait=30)
+        coordinator.warm = {'cold': set(), 'warm': {'test-package'}}
+        for pkgbase in ('test-package', 'test-other-package'):
+            coordinator.submit(Request(None, {'pkgbase': pkgbase, 'chbuild': 'extra-x86_64-build'}, b''))
+
+        self.assertEqual(coordinator.pick('cold', ['extra-x86_64-build']).message['pkgbase'], 'test-other-package')
+        self.assertEqual(coordinator.pick('warm', ['extra-x86_64-build']).message['pkgbase'], 'test-package')
+        self.assertIsNone(coordinator.pick('cold', ['extra-i686-build']))
+
+        coordinator.requests[0].submitted = time.monotonic() - 60
+        self.assertEqual(coordinator.pick('cold', ['extra-x86_64-build']).message['pkgbase'], 'test-package')
+
+    def test_relay_without_worker(self):
+        coordinator_end, agent_end = socket.socketpair()
+        worker_end, gone = socket.socketpair()
+        gone.close()
+        send(agent_end, {'type': 'log'}, b'==> Starting build()\n')
+        send(agent_end, {'type': 'result', 'status': 0, 'durations': {}})
+
+        Coordinator().relay(coordinator_end, Request(worker_end, {'pkgbase': 'test-package'}, b''))
+
+        # The build was drained, the agent connection is still usable
+        self.assertEqual(receive(agent_end)[0]['type'], 'build')
+        for sock in (coordinator_end, agent_end, worker_end):
+            sock.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
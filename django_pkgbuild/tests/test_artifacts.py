@@ -0,0 +1,59 @@
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from django_pkgbuild.artifacts import parse_filename, prune_directory, publish_file
+
+
+class ArtifactsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pkg_dir = Path(self.tmp.name) / 'test-package'
+        self.repo_dir = Path(self.tmp.name) / 'test' / 'x86_64'
+        self.pkg_dir.mkdir()
+        self.repo_dir.mkdir(parents=True)
+
+    def test_publish_file(self):
+        package = self.pkg_dir / 'test-package-1:1.0.0-1-x86_64.pkg.tar.xz'
+        package.write_bytes(b'package')
+
+        self.assertEqual(publish_file(package, self.repo_dir), 'hardlink')
+        self.assertEqual(package.stat().st_nlink, 2)
+
+        # Publishing again replaces the previous file, without a temporary file left behind
+        self.assertEqual(publish_file(package, self.repo_dir), 'hardlink')
+        self.assertEqual((self.repo_dir / package.name).read_bytes(), b'package')
+        self.assertEqual([path.name for path in self.repo_dir.iterdir()], [package.name])
+
+        # A rebuilt package replaces the published one
+        package.unlink()
+        package.write_bytes(b'rebuilt')
+        self.assertEqual(publish_file(package, self.repo_dir), 'hardlink')
+        self.assertEqual((self.repo_dir / package.name).read_bytes(), b'rebuilt')
+        self.assertEqual([path.name for path in self.repo_dir.iterdir()], [package.name])
+
+    def test_parse_filename(self):
+        names = {'test-package', 'test'}
+
+        self.assertEqual(parse_filename('test-package-1:1.0.0-1-x86_64.pkg.tar.xz', names),
+                         ('test-package', '1:1.0.0-1'))
+        self.assertEqual(parse_filename('test-package-1.0.0-2-any.pkg.tar.xz.sig', names), ('test-package', '1.0.0-2'))
+        self.assertIsNone(parse_filename('test-other-1.0.0-1-any.pkg.tar.xz', names))
+        self.assertIsNone(parse_filename('test.db.tar.gz', names))
+
+    def test_prune_directory(self):
+        for version in ('1.0.0-1', '1.0.0-2', '1.1.0-1'):
+            (self.repo_dir / f'test-package-{version}-x86_64.pkg.tar.xz').write_bytes(b'package')
+        (self.repo_dir / 'test-package-1.0.0-2-x86_64.pkg.tar.xz.sig').write_bytes(b'sig')
+
+        freed = prune_directory(self.repo_dir, {'test-package': {'1.1.0-1'}},
+                                {'test-package-1.0.0-2-x86_64.pkg.tar.xz'})
+
+        self.assertEqual(freed, len(b'package'))
+        self.assertEqual(sorted(path.name for path in self.repo_dir.iterdir()),
+                         ['test-package-1.0.0-2-x86_64.pkg.tar.xz', 'test-package-1.0.0-2-x86_64.pkg.tar.xz.sig',
+                          'test-package-1.1.0-1-x86_64.pkg.tar.xz'])
+
+    def tearDown(self):
+        self.tmp.cleanup()
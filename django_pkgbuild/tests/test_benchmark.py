@@ -0,0 +1,42 @@
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from django_pkgbuild.benchmark import generate_tree, run, stub_tools
+from django_pkgbuild.srcinfo import is_stale, read_srcinfo
+from django_pkgbuild.tasks import find_pkgbuilds
+
+
+class BenchmarkTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / 'packages'
+
+    def test_generate_tree(self):
+        tips = generate_tree(self.root, 25, chain=10)
+
+        pkgbuilds = list(find_pkgbuilds(self.root))
+        self.assertEqual(len(pkgbuilds), 25)
+        self.assertIn(True, [official for directory, official in pkgbuilds])
+        self.assertEqual(tips, ['bench-00009', 'bench-00019', 'bench-00024'])
+        directory = self.root / 'bench-00005'
+        self.assertFalse(is_stale(directory))
+        self.assertIn('bench-00004', read_srcinfo(directory).build_depends())
+
+    def test_run(self):
+        repositories_root = Path(self.tmp.name) / 'repositories'
+        repositories_root.mkdir()
+        with override_settings(PKGBUILD={**settings.PKGBUILD, 'packages_root': str(self.root),
+                                         'repositories_root': str(repositories_root), 'static': False}), \
+                stub_tools():
+            results = run(self.root, 20, chain=5)
+
+        self.assertEqual([result['name'] for result in results],
+                         ['refresh_full', 'refresh_unchanged', 'refresh_changed', 'parse_srcinfo',
+                          'add_package_to_repo', 'index'])
+        self.assertTrue(all(result['queries'] for result in results))
+
+    def tearDown(self):
+        self.tmp.cleanup()
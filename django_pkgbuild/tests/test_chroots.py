@@ -0,0 +1,81 @@
+import io
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from django_pkgbuild.chroots import (PREPARE_TIMEOUT, build_command, cleanup_chroots, parse_target, prepare_chroot,
+                                     update_command)
+from django_pkgbuild.models import Batch, Chroot
+
+
+class ChrootsTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.override = override_settings(PKGBUILD={'chroots_root': self.tmp.name})
+        self.override.enable()
+        self.batch = Batch.objects.create()
+
+    def test_parse_target(self):
+        self.assertEqual(parse_target('extra-x86_64-build'), ('extra', 'x86_64'))
+        self.assertEqual(parse_target('staging-i686-build'), ('staging', 'i686'))
+        self.assertEqual(parse_target('multilib-build'), ('multilib', 'x86_64'))
+        self.assertEqual(parse_target('multilib-testing-build'), ('multilib-testing', 'x86_64'))
+
+    def test_commands(self):
+        self.assertEqual(update_command('extra-x86_64-build')[-4:],
+                         [f'{self.root}/extra-x86_64/root', 'pacman', '-Syuu', '--noconfirm'])
+        self.assertEqual(build_command('extra-x86_64-build', 'batch1-build2', ['-I', 'dep.pkg.tar.xz']),
+                         ['sudo', 'makechrootpkg', '-c', '-r', f'{self.root}/extra-x86_64', '-l',
+                          'batch1-build2', '-I', 'dep.pkg.tar.xz'])
+
+    @mock.patch('django_pkgbuild.chroots.run_timed', return_value=(0, {}))
+    def test_prepare_chroot_once(self, run_timed):
+        (self.root / 'extra-x86_64' / 'root').mkdir(parents=True)
+
+        self.assertTrue(prepare_chroot(self.batch.id, 'extra-x86_64-build', io.BytesIO()))
+        self.assertTrue(prepare_chroot(self.batch.id, 'extra-x86_64-build', io.BytesIO()))
+
+        run_timed.assert_called_once()
+        self.assertEqual(run_timed.call_args[0][0][1], 'arch-nspawn')
+        # A new batch updates the chroot again
+        self.assertTrue(prepare_chroot(Batch.objects.create().id, 'extra-x86_64-build', io.BytesIO()))
+        self.assertEqual(run_timed.call_count, 2)
+
+    @mock.patch('django_pkgbuild.chroots.run_timed', return_value=(1, {}))
+    def test_prepare_chroot_failed(self, run_timed):
+        (self.root / 'extra-x86_64' / 'root').mkdir(parents=True)
+
+        self.assertFalse(prepare_chroot(self.batch.id, 'extra-x86_64-build', io.BytesIO()))
+        self.assertEqual(Chroot.objects.get(batch=self.batch).state, Chroot.FAILED)
+
+    @mock.patch('django_pkgbuild.chroots.time.sleep')
+    @mock.patch('django_pkgbuild.chroots.run_timed', return_value=(0, {}))
+    def test_prepare_chroot_abandoned(self, run_timed, sleep):
+        (self.root / 'extra-x86_64' / 'root').mkdir(parents=True)
+        chroot = Chroot.objects.create(batch=self.batch, target='extra-x86_64-build')
+        Chroot.objects.filter(id=chroot.id).update(updated=timezone.now() - PREPARE_TIMEOUT * 2)
+
+        # The worker preparing the chroot was killed, so the next build prepares it again
+        self.assertTrue(prepare_chroot(self.batch.id, 'extra-x86_64-build', io.BytesIO()))
+        run_timed.assert_called_once()
+
+    @mock.patch('django_pkgbuild.chroots.remove_copy')
+    def test_cleanup_chroots(self, remove_copy):
+        directory = self.root / 'extra-x86_64'
+        for name in ('root', f'batch{self.batch.id}-build1', f'batch{self.batch.id + 1}-build2'):
+            (directory / name).mkdir(parents=True)
+        (directory / f'batch{self.batch.id}-build3.lock').touch()
+        Chroot.objects.create(batch=self.batch, target='extra-x86_64-build', state=Chroot.READY)
+
+        cleanup_chroots(self.batch)
+
+        self.assertEqual({call[0][0].name for call in remove_copy.call_args_list},
+                         {f'batch{self.batch.id}-build1', f'batch{self.batch.id}-build3'})
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmp.cleanup()
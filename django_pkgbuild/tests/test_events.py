@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from django_pkgbuild.events import format_event, stream, tail
+from django_pkgbuild.models import Architecture, Build, Event, Job, Package, Repository
+from django_pkgbuild.scheduler import schedule
+
+
+@override_settings(PKGBUILD={
+    'packages_root': os.getcwd() + '/django_pkgbuild/tests/packages',
+    'repositories_root': os.getcwd() + '/django_pkgbuild/tests/repositories',
+}, ROOT_URLCONF='django_pkgbuild.urls')
+@mock.patch('django_pkgbuild.scheduler.dispatch')
+class EventsTestCase(TestCase):
+    fixtures = ['test-architectures', 'test-packages']
+
+    def setUp(self):
+        self.repo = Repository.objects.create(name='test', description='test', target=Repository.EXTRA)
+        self.repo.architectures.add(Architecture.objects.get(name='x86_64'))
+        self.test_pkg = Package.objects.get(name='test-package')
+
+    def test_format_event(self, dispatch):
+        self.assertEqual(format_event(3, 'log', 'first\nsecond'), 'id: 3\nevent: log\ndata: first\ndata: second\n\n')
+
+    def test_stream(self, dispatch):
+        schedule([(self.test_pkg, self.repo)])
+        event = Event.objects.get()
+
+        self.assertEqual(event.kind, Event.QUEUED)
+        lines = next(stream(0, timeout=1)).splitlines()
+        self.assertEqual(lines[:2], [f'id: {event.id}', 'event: queued'])
+        self.assertEqual(json.loads(lines[2][len('data: '):])['base_package'], 'test-package')
+        # Streams resume after the last event received
+        response = self.client.get('/events/', HTTP_LAST_EVENT_ID=str(event.id))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+    def test_tail(self, dispatch):
+        build = Build.objects.create(base_package=self.test_pkg.base_package, version='1.0-1',
+                                     architecture=Architecture.objects.get(name='x86_64'), started=timezone.now(),
+                                     finished=timezone.now(), status=0)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'build.log'
+            path.write_bytes(b'==> Starting build()\nmake\n')
+
+            self.assertEqual(list(tail(build.id, path, 0, timeout=1)), [
+                'id: 26\nevent: log\ndata: ==> Starting build()\ndata: make\n\n',
+                'id: 26\nevent: end\ndata: \n\n',
+            ])
+            self.assertEqual(list(tail(build.id, path, 21, timeout=1)), [
+                'id: 26\nevent: log\ndata: make\n\n',
+                'id: 26\nevent: end\ndata: \n\n',
+            ])
+
+    def test_tail_dead_build(self, dispatch):
+        job = schedule([(self.test_pkg, self.repo)]).jobs.get()
+        build = Build.objects.create(base_package=self.test_pkg.base_package, version='1.0-1',
+                                     architecture=Architecture.objects.get(name='x86_64'), started=timezone.now())
+        Job.objects.filter(id=job.id).update(state=Job.BUILDING, build=build)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'build.log'
+            path.write_bytes(b'==> Starting build()\nmake')
+
+            # Only complete lines are sent while the job builds
+            self.assertEqual(list(tail(build.id, path, 0, timeout=1)), [
+                'id: 21\nevent: log\ndata: ==> Starting build()\n\n',
+            ])
+            # The worker died, and its job was failed without finishing the build
+            Job.objects.filter(id=job.id).update(state=Job.FAILED)
+            self.assertEqual(list(tail(build.id, path, 21, timeout=1)), [
+                'id: 25\nevent: log\ndata: make\n\n',
+                'id: 25\nevent: end\ndata: \n\n',
+            ])
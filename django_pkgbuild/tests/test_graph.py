@@ -0,0 +1,55 @@
+from django.test import SimpleTestCase
+
+from django_pkgbuild.graph import DependencyGraph
+
+
+class DependencyGraphTestCase(SimpleTestCase):
+    def setUp(self):
+        self.graph = DependencyGraph()
+        # Base packages 1 to 5, each with a single package of the same id, 5 also provides virtual package 6
+        for pk in range(1, 6):
+            self.graph.names[pk] = f'package-{pk}'
+            self.graph.base_packages[pk] = pk
+        self.graph.names[6] = 'virtual-package'
+        self.graph.base_packages[6] = 5
+        self.graph.virtual.add(6)
+        self.graph.providers[6].append(5)
+
+    def test_closures(self):
+        # 1 -> 2 -> 3 -> virtual-package (5)
+        self.graph.depends[1] = {2}
+        self.graph.depends[2] = {3}
+        self.graph.depends[3] = {6}
+
+        closures, cycles = self.graph.closures()
+
+        self.assertEqual(closures[1], {2, 3, 5})
+        self.assertEqual(closures[2], {3, 5})
+        self.assertEqual(closures[3], {5})
+        self.assertEqual(closures[4], set())
+        self.assertEqual(cycles, [])
+
+    def test_closures_with_cycle(self):
+        # 1 -> 2 -> 3 -> 2, 4 -> 1
+        self.graph.depends[1] = {2}
+        self.graph.depends[2] = {3}
+        self.graph.depends[3] = {2}
+        self.graph.depends[4] = {1}
+
+        closures, cycles = self.graph.closures()
+
+        self.assertEqual(closures[2], {3})
+        self.assertEqual(closures[3], {2})
+        self.assertEqual(closures[4], {1, 2, 3})
+        self.assertEqual([sorted(cycle) for cycle in cycles], [[2, 3]])
+
+    def test_closures_deep_chain(self):
+        for pk in range(10, 2000):
+            self.graph.names[pk] = f'package-{pk}'
+            self.graph.base_packages[pk] = pk
+            self.graph.depends[pk] = {pk + 1} if pk < 1999 else set()
+
+        closures, cycles = self.graph.closures()
+
+        self.assertEqual(len(closures[10]), 1989)
+        self.assertEqual(cycles, [])
@@ -0,0 +1,28 @@
+from django.test import TestCase
+
+from django_pkgbuild import metrics
+from django_pkgbuild.models import Metric
+
+
+class MetricsTestCase(TestCase):
+    def test_observe(self):
+        metrics.observe('pkgbuild_build_duration_seconds', {'repository': 'test'}, 30, 120, 100000)
+
+        def value(name, labels):
+            return Metric.objects.get(name=name, labels=metrics.format_labels(labels)).value
+
+        self.assertEqual(value('pkgbuild_build_duration_seconds_bucket', {'repository': 'test', 'le': 60}), 1)
+        self.assertEqual(value('pkgbuild_build_duration_seconds_bucket', {'repository': 'test', 'le': 300}), 2)
+        self.assertEqual(value('pkgbuild_build_duration_seconds_bucket', {'repository': 'test', 'le': '+Inf'}), 3)
+        self.assertEqual(value('pkgbuild_build_duration_seconds_count', {'repository': 'test'}), 3)
+        self.assertEqual(value('pkgbuild_build_duration_seconds_sum', {'repository': 'test'}), 100150)
+
+    def test_exposition(self):
+        metrics.inc('pkgbuild_builds_in_progress', {'repository': 'test'})
+        metrics.inc('pkgbuild_builds_in_progress', {'repository': 'test'})
+        metrics.dec('pkgbuild_builds_in_progress', {'repository': 'test'})
+
+        exposition = metrics.exposition()
+
+        self.assertIn('# TYPE pkgbuild_builds_in_progress gauge', exposition)
+        self.assertIn('pkgbuild_builds_in_progress{repository="test"} 1\n', exposition)
@@ -0,0 +1,27 @@
+import io
+
+from django.test import SimpleTestCase
+
+from django_pkgbuild.phases import run_timed
+
+SCRIPT = '''
+echo ':: Synchronizing package databases...'
+echo 'loading packages...'
+echo '==> Retrieving sources...'
+printf '\\033[1m==> Starting build()...\\033[0m\\n'
+echo '==> Entering fakeroot environment...'
+echo '==> Starting package()...'
+echo '==> Finished making: test-package 1.0.0-1'
+exit 3
+'''
+
+
+class PhasesTestCase(SimpleTestCase):
+    def test_run_timed(self):
+        log = io.BytesIO()
+
+        status, durations = run_timed(['sh', '-c', SCRIPT], '.', log)
+
+        self.assertEqual(status, 3)
+        self.assertEqual(list(durations), ['chroot', 'dependencies', 'sources', 'compile', 'package', 'cleanup'])
+        self.assertIn(b'==> Starting package()...', log.getvalue())
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from django_pkgbuild.models import Architecture, Build, Job, Package, Repository
+from django_pkgbuild.prefetch import (FETCH_TIMEOUT, claim, fetch, fetch_sources, prefetch_enabled, upcoming_jobs,
+                                     verify_sources)
+from django_pkgbuild.scheduler import schedule
+
+PKGBUILD = '''pkgname=test-sources
+pkgver=1.0
+pkgrel=1
+arch=('any')
+source=("file://{source}")
+sha256sums=('{checksum}')
+'''
+
+
+@mock.patch('django_pkgbuild.scheduler.dispatch')
+class PrefetchTestCase(TestCase):
+    fixtures = ['test-architectures', 'test-packages']
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.override = override_settings(PKGBUILD={
+            'packages_root': os.getcwd() + '/django_pkgbuild/tests/packages',
+            'repositories_root': self.tmp.name,
+            'srcdest': f'{self.tmp.name}/sources',
+            'prefetch_concurrency': 2,
+        })
+        self.override.enable()
+
+        self.repo = Repository.objects.create(name='test', description='test', target=Repository.EXTRA)
+        self.repo.architectures.add(Architecture.objects.get(name='x86_64'))
+        self.test_pkg = Package.objects.get(name='test-package')
+        self.test_depends_pkg = Package.objects.get(name='test-depends-package')
+
+    @unittest.skipUnless(shutil.which('makepkg'), 'makepkg is not installed')
+    def test_verify_sources(self, dispatch):
+        source = self.root / 'source.txt'
+        source.write_text('source\n')
+        directory = self.root / 'test-sources'
+        directory.mkdir()
+        (self.root / 'sources').mkdir()
+        checksum = hashlib.sha256(source.read_bytes()).hexdigest()
+        (directory / 'PKGBUILD').write_text(PKGBUILD.format(source=source, checksum=checksum))
+
+        self.assertEqual(verify_sources(directory, subprocess.DEVNULL), 0)
+        self.assertTrue((self.root / 'sources' / 'source.txt').is_file())
+
+        (directory / 'PKGBUILD').write_text(PKGBUILD.format(source=source, checksum='0' * 64))
+        self.assertNotEqual(verify_sources(directory, subprocess.DEVNULL), 0)
+
+    def test_upcoming_jobs(self, dispatch):
+        batch = schedule([(self.test_depends_pkg, self.repo), (self.test_pkg, self.repo)])
+        depends_job = batch.jobs.get(package=self.test_depends_pkg)
+        test_job = batch.jobs.get(package=self.test_pkg)
+
+        # Queued jobs come before the ones waiting for their dependencies
+        self.assertEqual(upcoming_jobs(depends_job, 4), [test_job])
+        self.assertEqual(upcoming_jobs(test_job, 4), [depends_job])
+
+        base_pkg = self.test_depends_pkg.base_package
+        Build.objects.create(base_package=base_pkg, version=base_pkg.version,
+                             architecture=Architecture.objects.get(name='x86_64'), target=Repository.EXTRA, status=0)
+        # The current version was built, so its artifacts will be reused
+        self.assertEqual(upcoming_jobs(test_job, 4), [])
+
+    @mock.patch('django_pkgbuild.prefetch.verify_sources', side_effect=[1, 0])
+    def test_fetch_sources_retries_prefetch_failures(self, verify_sources, dispatch):
+        job = schedule([(self.test_pkg, self.repo)]).jobs.get()
+        Job.objects.filter(id=job.id).update(sources=Job.FAILED)
+        log_path = self.root / 'logs' / 'sources.log'
+
+        self.assertFalse(fetch_sources(job, log_path))
+        self.assertTrue(fetch_sources(job, log_path))
+        self.assertTrue(log_path.is_file())
+        self.assertEqual(Job.objects.get(id=job.id).sources, Job.FETCHED)
+        # Fetched sources are not fetched again
+        self.assertTrue(fetch_sources(job, log_path))
+        self.assertEqual(verify_sources.call_count, 2)
+
+    @mock.patch('django_pkgbuild.prefetch.verify_sources', side_effect=OSError)
+    def test_fetch_failure(self, verify_sources, dispatch):
+        job = schedule([(self.test_pkg, self.repo)]).jobs.get()
+
+        self.assertTrue(claim(job))
+        with self.assertRaises(OSError):
+            fetch(job, subprocess.DEVNULL)
+        # Builds fetch the sources again rather than waiting for them
+        self.assertEqual(Job.objects.get(id=job.id).sources, Job.FAILED)
+
+    @mock.patch('django_pkgbuild.prefetch.verify_sources', return_value=0)
+    def test_fetch_sources_takes_over_abandoned_fetches(self, verify_sources, dispatch):
+        job = schedule([(self.test_pkg, self.repo)]).jobs.get()
+        Job.objects.filter(id=job.id).update(sources=Job.FETCHING, updated=timezone.now() - FETCH_TIMEOUT * 2)
+
+        self.assertFalse(claim(job))
+        self.assertTrue(fetch_sources(job, self.root / 'logs' / 'sources.log'))
+        self.assertEqual(verify_sources.call_count, 1)
+
+    def test_prefetch_enabled(self, dispatch):
+        self.assertTrue(prefetch_enabled())
+
+        # Builds go on without prefetching rather than failing
+        with override_settings(PKGBUILD={'packages_root': self.tmp.name, 'prefetch_concurrency': 2}):
+            with self.assertLogs('django_pkgbuild.prefetch', 'WARNING'):
+                self.assertFalse(prefetch_enabled())
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmp.cleanup()
@@ -0,0 +1,77 @@
+import io
+import tarfile
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from django_pkgbuild.repodb import update_repodb
+
+PKGINFO = '''# Generated by makepkg
+pkgname = {name}
+pkgbase = {name}
+pkgver = {version}
+pkgdesc = Test Package
+url = https://example.org
+builddate = 1500000000
+packager = Unknown Packager
+size = 1024
+arch = x86_64
+license = GPL
+depend = glibc
+depend = zlib
+'''
+
+
+class RepoDbTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp.name)
+
+    def make_package(self, name, version):
+        filename = f'{name}-{version}-x86_64.pkg.tar.xz'
+        with tarfile.open(str(self.directory / filename), 'w:xz') as archive:
+            for member, data in (('.PKGINFO', PKGINFO.format(name=name, version=version).encode()),
+                                 ('usr/bin/' + name, b'binary')):
+                info = tarfile.TarInfo(member)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+            info = tarfile.TarInfo('usr')
+            info.type = tarfile.DIRTYPE
+            archive.addfile(info)
+        return filename
+
+    def read_database(self, suffix):
+        with tarfile.open(str(self.directory / f'test.{suffix}'), 'r:gz') as archive:
+            return {member.name: archive.extractfile(member).read().decode() if member.isfile() else None
+                    for member in archive}
+
+    def test_update_repodb(self):
+        update_repodb(self.directory, 'test', [],
+                      [self.make_package('foo', '1.0-1'), self.make_package('bar', '2.0-1')])
+
+        db = self.read_database('db')
+        self.assertEqual(set(db), {'foo-1.0-1', 'foo-1.0-1/desc', 'bar-2.0-1', 'bar-2.0-1/desc'})
+        self.assertTrue(db['foo-1.0-1/desc'].startswith('%FILENAME%\nfoo-1.0-1-x86_64.pkg.tar.xz\n\n%NAME%\nfoo\n\n'))
+        self.assertIn('%DEPENDS%\nglibc\nzlib\n\n', db['foo-1.0-1/desc'])
+        self.assertEqual(self.read_database('files')['foo-1.0-1/files'], '%FILES%\nusr/\nusr/bin/foo\n\n')
+
+        # Only the new version of foo is compressed, bar is reused
+        update_repodb(self.directory, 'test', ['bar'], [self.make_package('foo', '1.1-1')])
+
+        self.assertEqual(set(self.read_database('db')), {'foo-1.1-1', 'foo-1.1-1/desc'})
+
+    def test_bootstrap(self):
+        update_repodb(self.directory, 'test', [], [self.make_package('foo', '1.0-1')])
+        for chunk in (self.directory / '.test.index').iterdir():
+            chunk.unlink()
+        (self.directory / '.test.index').rmdir()
+
+        update_repodb(self.directory, 'test', [], [self.make_package('bar', '2.0-1')])
+
+        self.assertEqual(set(self.read_database('files')),
+                         {'foo-1.0-1', 'foo-1.0-1/desc', 'foo-1.0-1/files', 'bar-2.0-1', 'bar-2.0-1/desc',
+                          'bar-2.0-1/files'})
+
+    def tearDown(self):
+        self.tmp.cleanup()
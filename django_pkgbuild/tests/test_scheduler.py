@@ -0,0 +1,120 @@
+import os
+import shutil
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from django_pkgbuild.models import Architecture, Job, Package, Publication, Repository
+from django_pkgbuild.scheduler import dispatch_jobs, finish_job, pick_jobs, prioritize, schedule
+
+
+@override_settings(PKGBUILD={
+    'packages_root': os.getcwd() + '/django_pkgbuild/tests/packages',
+    'repositories_root': os.getcwd() + '/django_pkgbuild/tests/repositories',
+    'slots': 4,
+})
+@mock.patch('django_pkgbuild.scheduler.dispatch')
+class SchedulerTestCase(TestCase):
+    fixtures = ['test-architectures', 'test-packages']
+
+    def setUp(self):
+        self.repos_path = Path(settings.PKGBUILD["repositories_root"])
+        if self.repos_path.exists():
+            shutil.rmtree(self.repos_path)
+        self.repos_path.mkdir(parents=True)
+
+        self.repo = Repository.objects.create(name='test', description='test', target=Repository.EXTRA)
+        self.repo.architectures.add(Architecture.objects.get(name='i686'))
+        self.repo.architectures.add(Architecture.objects.get(name='x86_64'))
+
+        self.test_pkg = Package.objects.get(name='test-package')
+        self.test_depends_pkg = Package.objects.get(name='test-depends-package')
+
+    def test_schedule_dependencies_first(self, dispatch):
+        batch = schedule([(self.test_depends_pkg, self.repo), (self.test_pkg, self.repo)])
+
+        self.assertEqual(batch.jobs.count(), 4)
+        self.assertEqual({call[0][0].package for call in dispatch.call_args_list}, {self.test_pkg})
+        self.assertEqual(batch.jobs.filter(state=Job.PENDING, package=self.test_depends_pkg).count(), 2)
+
+        for job in batch.jobs.filter(package=self.test_pkg):
+            finish_job(job, True)
+
+        self.assertEqual(dispatch.call_count, 4)
+        self.assertFalse(batch.jobs.filter(state=Job.PENDING).exists())
+
+    def test_schedule_probes_revisions(self, dispatch):
+        revisions = {self.test_pkg.base_package_id: '0' * 40}
+        with mock.patch('django_pkgbuild.scheduler.probe_packages', return_value=revisions) as probe_packages:
+            batch = schedule([(self.test_pkg, self.repo)])
+
+        # Every VCS package of the batch is probed at once, and its jobs build that revision
+        probe_packages.assert_called_once_with({self.test_pkg.base_package})
+        self.assertEqual(set(batch.jobs.values_list('revision', flat=True)), {'0' * 40})
+
+    def test_schedule_skips_failed_dependencies(self, dispatch):
+        batch = schedule([(self.test_depends_pkg, self.repo), (self.test_pkg, self.repo)])
+
+        for job in batch.jobs.filter(package=self.test_pkg):
+            finish_job(job, False)
+
+        self.assertEqual(dispatch.call_count, 2)
+        self.assertEqual(batch.jobs.filter(state=Job.SKIPPED).count(), 2)
+        batch.refresh_from_db()
+        self.assertIsNotNone(batch.finished)
+        self.assertIsNone(batch.snapshot)
+
+    def test_schedule_dedupes_repositories(self, dispatch):
+        other_repo = Repository.objects.create(name='other', description='other', target=Repository.EXTRA)
+        other_repo.architectures.add(Architecture.objects.get(name='x86_64'))
+        testing_repo = Repository.objects.create(name='testing', description='testing', target=Repository.TESTING)
+        testing_repo.architectures.add(Architecture.objects.get(name='x86_64'))
+
+        batch = schedule([(self.test_pkg, self.repo), (self.test_pkg, other_repo), (self.test_pkg, testing_repo)])
+
+        # One job per chroot target and architecture, publishing to every repository
+        self.assertEqual(batch.jobs.count(), 3)
+        self.assertEqual(Publication.objects.filter(job__batch=batch).count(), 4)
+        x86_64_job = batch.jobs.get(architecture__name='x86_64', repository__target=Repository.EXTRA)
+        self.assertEqual({publication.repository for publication in x86_64_job.publications.all()},
+                         {self.repo, other_repo})
+
+    def test_pick_jobs(self, dispatch):
+        nightly = [Job(id=i, repository_id=1, priority=Job.NIGHTLY) for i in range(1, 5)]
+        other = [Job(id=i, repository_id=2, priority=Job.NIGHTLY) for i in range(5, 7)]
+        interactive = Job(id=7, repository_id=1, priority=Job.INTERACTIVE)
+
+        self.assertEqual([job.id for job in pick_jobs(nightly + other + [interactive], [], 4)], [7, 5, 1, 6])
+        # Repositories with fewer jobs running catch up first
+        self.assertEqual([job.id for job in pick_jobs(nightly + other, [1, 1], 3)], [5, 6, 1])
+
+    def test_interactive_jobs_go_first(self, dispatch):
+        with self.settings(PKGBUILD={**settings.PKGBUILD, 'slots': 1}):
+            nightly = schedule([(self.test_pkg, self.repo)])
+            interactive = schedule([(self.test_depends_pkg, self.repo), (self.test_pkg, self.repo)],
+                                   priority=Job.INTERACTIVE)
+            self.assertEqual(dispatch.call_count, 1)
+
+            finish_job(dispatch.call_args[0][0], True)
+
+            # The interactive batch goes before the rest of the nightly one
+            self.assertEqual(dispatch.call_args[0][0].batch, interactive)
+            self.assertEqual(nightly.jobs.filter(state=Job.READY).count(), 1)
+
+    def test_prioritize(self, dispatch):
+        with self.settings(PKGBUILD={**settings.PKGBUILD, 'slots': 0}):
+            batch = schedule([(self.test_depends_pkg, self.repo), (self.test_pkg, self.repo)])
+            depends_jobs = batch.jobs.filter(package=self.test_depends_pkg)
+
+            prioritize(depends_jobs)
+
+            # The jobs they wait for are raised along with them
+            self.assertFalse(batch.jobs.exclude(priority=Job.INTERACTIVE).exists())
+            self.assertFalse(dispatch.called)
+        dispatch_jobs()
+        self.assertEqual(dispatch.call_count, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.repos_path)
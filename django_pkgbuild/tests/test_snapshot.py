@@ -0,0 +1,30 @@
+import pickle
+
+from django.test import TestCase
+
+from django_pkgbuild.models import Architecture, BasePackage, Package
+from django_pkgbuild.snapshot import Snapshot
+
+
+class SnapshotTestCase(TestCase):
+    fixtures = ['test-architectures', 'test-packages']
+
+    def setUp(self):
+        self.snapshot = pickle.loads(Snapshot.load().dumps())
+
+    def test_filename(self):
+        arch = Architecture.objects.get(name='i686')
+        for pkg in Package.objects.filter(virtual=False):
+            self.assertEqual(self.snapshot.filename(pkg.id, arch.name), pkg.filename(arch))
+
+    def test_install_args(self):
+        base_pkg = BasePackage.objects.get(name='test-depends-package')
+        dep = Package.objects.get(name='test-package')
+
+        with self.assertNumQueries(0):
+            args = self.snapshot.install_args(base_pkg.id, 'x86_64')
+            versions_args = self.snapshot.install_args(base_pkg.id, 'x86_64', {dep.base_package_id: '2.0.0-1'})
+
+        filename = dep.filename(Architecture.objects.get(name='x86_64'))
+        self.assertEqual(args, ['-I', f'{dep.base_package.directory()}/{filename}'])
+        self.assertTrue(versions_args[1].endswith('test-package-2.0.0-1-x86_64.pkg.tar.xz'))
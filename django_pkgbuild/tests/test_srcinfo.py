@@ -0,0 +1,73 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from django_pkgbuild.srcinfo import is_stale, parse, read_srcinfo
+
+SRCINFO = '''
+pkgbase = test-split-package
+	pkgdesc = Test Split Package
+	pkgver = 2.1.0
+	pkgrel = 2
+	epoch = 1
+	arch = i686
+	arch = x86_64
+	license = GPL
+	makedepends = test-make-package
+	depends = test-package>=1.0
+	depends_x86_64 = test-multilib-package
+	provides = test-virtual-package=2.1.0
+
+pkgname = test-first-package
+
+pkgname = test-second-package
+	depends = test-other-package
+	provides =
+'''
+
+
+class SrcInfoTestCase(SimpleTestCase):
+    def test_parse(self):
+        srcinfo = parse(SRCINFO.splitlines())
+
+        self.assertEqual(srcinfo.name, 'test-split-package')
+        self.assertEqual(srcinfo.version, '1:2.1.0-2')
+        self.assertEqual(srcinfo.get('arch'), ['i686', 'x86_64'])
+        self.assertEqual(list(srcinfo.packages), ['test-first-package', 'test-second-package'])
+        self.assertEqual(srcinfo.pkgbase['depends_x86_64'], ['test-multilib-package'])
+        self.assertEqual(srcinfo.build_depends(), ['test-make-package', 'test-package', 'test-multilib-package'])
+
+    def test_parse_overrides(self):
+        srcinfo = parse(SRCINFO.splitlines())
+
+        self.assertEqual(srcinfo.provides('test-first-package'), ['test-virtual-package'])
+        self.assertEqual(srcinfo.provides('test-second-package'), [])
+        self.assertEqual(srcinfo.get('depends', 'test-first-package'), ['test-package>=1.0'])
+        self.assertEqual(srcinfo.get('depends', 'test-second-package'), ['test-other-package'])
+
+    def test_read_srcinfo_reuses_fresh_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            pkgbuild = Path(directory) / 'PKGBUILD'
+            pkgbuild.touch()
+            (Path(directory) / '.SRCINFO').write_text(SRCINFO)
+            os.utime(pkgbuild, (0, 0))
+
+            self.assertFalse(is_stale(directory))
+            with mock.patch('django_pkgbuild.srcinfo.generate_srcinfo') as generate_srcinfo:
+                srcinfo = read_srcinfo(directory)
+            generate_srcinfo.assert_not_called()
+            self.assertEqual(srcinfo.name, 'test-split-package')
+
+    def test_read_srcinfo_regenerates_stale_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            (Path(directory) / '.SRCINFO').write_text(SRCINFO)
+            os.utime(Path(directory) / '.SRCINFO', (0, 0))
+            (Path(directory) / 'PKGBUILD').touch()
+
+            self.assertTrue(is_stale(directory))
+            with mock.patch('django_pkgbuild.srcinfo.generate_srcinfo') as generate_srcinfo:
+                read_srcinfo(directory)
+            generate_srcinfo.assert_called_once_with(directory)
@@ -1,12 +1,20 @@
+import multiprocessing
 import os
 import shutil
+import subprocess
+import tempfile
 from pathlib import Path
+from unittest import mock
 
 from django.conf import settings
 from django.test import TestCase, override_settings
 
-from django_pkgbuild.models import Architecture, Package, Repository
-from django_pkgbuild.tasks import refresh_packages
+from django_pkgbuild.models import (Architecture, BasePackage, Build, BuildPhase, Job, Package, RefreshRequest,
+                                   Repository)
+from django_pkgbuild.scheduler import schedule
+from django_pkgbuild.tasks import (build_changed_packages, build_job_hook, changed_directories, find_pkgbuilds,
+                                  git_revision, refresh_packages, refresh_pending, refresh_pending_hook,
+                                  scan_pkgbuilds)
 
 
 @override_settings(PKGBUILD={
@@ -128,5 +136,156 @@ class TasksTestCase(TestCase):
         self.assertFalse(test_split_base_pkg.builds)
         self.assertFalse(test_split_base_pkg.official)
 
+    def test_refresh_packages_incremental(self):
+        refreshed = refresh_packages()
+        self.assertEqual(len(refreshed), BasePackage.objects.count())
+
+        # Nothing changed, nothing to parse
+        self.assertEqual(refresh_packages(), [])
+
+        refreshed = refresh_packages(full=True)
+        self.assertEqual(len(refreshed), BasePackage.objects.count())
+
+    def test_refresh_packages_paths(self):
+        refresh_packages()
+
+        refreshed = refresh_packages(full=True, paths=['test-package/PKGBUILD'])
+
+        self.assertEqual(refreshed, [BasePackage.objects.get(name='test-package').id])
+
+    def test_refresh_packages_git(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp) / 'packages'
+            shutil.copytree(settings.PKGBUILD['packages_root'], str(root))
+            git = ['git', '-c', 'user.name=test', '-c', 'user.email=test@localhost']
+            subprocess.run(['git', 'init', '-q'], cwd=root, check=True)
+            subprocess.run(git + ['add', '.'], cwd=root, check=True)
+            subprocess.run(git + ['commit', '-q', '-m', 'init'], cwd=root, check=True)
+            old = git_revision(root)
+
+            with self.settings(PKGBUILD={**settings.PKGBUILD, 'packages_root': str(root)}):
+                refresh_packages()
+                count = BasePackage.objects.count()
+
+                pkgbuild = root / 'test-official-package' / 'trunk' / 'PKGBUILD'
+                pkgbuild.write_text(pkgbuild.read_text() + '\n')
+                subprocess.run(git + ['commit', '-q', '-a', '-m', 'update'], cwd=root, check=True)
+
+                # The trunk of official packages is not a package of its own
+                self.assertEqual(changed_directories(root, old, git_revision(root)),
+                                 {root / 'test-official-package'})
+                refreshed = refresh_packages()
+
+                self.assertEqual(refreshed, [BasePackage.objects.get(name='test-official-package').id])
+                self.assertEqual(BasePackage.objects.count(), count)
+
+    @mock.patch('django_pkgbuild.tasks.schedule')
+    def test_build_changed_packages(self, schedule):
+        refreshed = refresh_packages()
+        test_base_pkg = BasePackage.objects.get(name='test-package')
+        depends_base_pkg = BasePackage.objects.get(name='test-depends-package')
+        self.repo.packages.add(Package.objects.get(name='test-depends-package'))
+        for base_pkg in BasePackage.objects.exclude(id=test_base_pkg.id):
+            Build.objects.create(base_package=base_pkg, version=base_pkg.version, architecture=self.x86_64_arch,
+                                 target=Repository.EXTRA, status=0)
+
+        build_changed_packages(refreshed)
+
+        targets = schedule.call_args[0][0]
+        self.assertEqual({pkg.name for pkg, repo in targets}, {'test-package', 'test-depends-package'})
+        self.assertEqual(schedule.call_args[1]['rebuilds'], {depends_base_pkg.id})
+
+    @mock.patch('django_pkgbuild.tasks.schedule')
+    def test_build_changed_packages_nightly(self, schedule):
+        refresh_packages()
+        self.repo.packages.add(*Package.objects.filter(name__in=('test-package', 'test-depends-package',
+                                                                  'test-provides-package')))
+        for base_pkg in BasePackage.objects.exclude(name='test-depends-package'):
+            Build.objects.create(base_package=base_pkg, version=base_pkg.version, architecture=self.x86_64_arch,
+                                 target=Repository.EXTRA, status=0)
+        BasePackage.objects.filter(name='test-provides-package').update(vcs_revision='0' * 40)
+
+        build_changed_packages([], nightly=True)
+
+        # The package added to the repository was never built, and the VCS one may be behind its remote
+        targets = schedule.call_args[0][0]
+        self.assertEqual({pkg.name for pkg, repo in targets}, {'test-depends-package', 'test-provides-package'})
+        self.assertEqual(schedule.call_args[1]['rebuilds'], set())
+
+    def test_refresh_pending(self):
+        RefreshRequest.objects.create(path='test-package/PKGBUILD')
+
+        with mock.patch('django_pkgbuild.tasks.refresh_packages', side_effect=OSError):
+            with self.assertRaises(OSError):
+                refresh_pending()
+        # Failed refreshes leave their requests to the next one
+        self.assertEqual(RefreshRequest.objects.count(), 1)
+
+        self.assertEqual(refresh_pending(), [BasePackage.objects.get(name='test-package').id])
+        self.assertFalse(RefreshRequest.objects.exists())
+        self.assertEqual(refresh_pending(), [])
+
+    @mock.patch('django_pkgbuild.tasks.build_packages')
+    @mock.patch('django_pkgbuild.tasks.build_changed_packages')
+    def test_refresh_pending_hook(self, build_changed_packages, build_packages):
+        with self.settings(PKGBUILD={**settings.PKGBUILD, 'refresh_builds': 'all'}):
+            refresh_pending_hook(mock.Mock(success=True, result=[1]))
+
+        # Partial refreshes never sweep every package
+        build_changed_packages.assert_called_once_with([1])
+        build_packages.assert_not_called()
+
+    @mock.patch('django_pkgbuild.tasks.add_package_to_database')
+    @mock.patch('django_pkgbuild.scheduler.dispatch')
+    def test_build_job_hook_reused_build(self, dispatch, add_package_to_database):
+        refresh_packages()
+        pkg = Package.objects.get(name='test-package')
+        job = schedule([(pkg, self.repo)]).jobs.first()
+        build = Build.objects.create(base_package=pkg.base_package, version=pkg.base_package.version,
+                                     architecture=job.architecture, target=Repository.EXTRA, status=0)
+        BuildPhase.objects.create(build=build, name='publish', duration=1)
+        Job.objects.filter(id=job.id).update(build=build)
+
+        build_job_hook(mock.Mock(success=True, result=True, args=[job.id]))
+
+        # Publishing the artifacts again is not part of the build
+        self.assertEqual(build.phases.filter(name='publish').count(), 1)
+
+    @mock.patch('django_pkgbuild.tasks.add_package_to_database', side_effect=OSError)
+    @mock.patch('django_pkgbuild.scheduler.dispatch')
+    def test_build_job_hook_publish_failure(self, dispatch, add_package_to_database):
+        refresh_packages()
+        pkg = Package.objects.get(name='test-package')
+        job = schedule([(pkg, self.repo)]).jobs.first()
+        build = Build.objects.create(base_package=pkg.base_package, version=pkg.base_package.version,
+                                     architecture=job.architecture, target=Repository.EXTRA, status=0)
+        Job.objects.filter(id=job.id).update(build=build)
+
+        with self.assertRaises(OSError):
+            build_job_hook(mock.Mock(success=True, result=True, args=[job.id]))
+
+        # The job does not hold its slot forever
+        self.assertEqual(Job.objects.get(id=job.id).state, Job.FAILED)
+
+    def test_scan_pkgbuilds_daemonic(self):
+        pkgbuilds = list(find_pkgbuilds(Path(settings.PKGBUILD['packages_root'])))
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+
+        def scan():
+            results.put([(directory.name, digest) for (directory, official), (digest, srcinfo)
+                         in scan_pkgbuilds(pkgbuilds, full=True)])
+
+        with self.settings(PKGBUILD={**settings.PKGBUILD, 'scan_workers': 2}):
+            # Like a Django Q worker
+            process = context.Process(target=scan, daemon=True)
+            process.start()
+            scanned = results.get(timeout=30)
+            process.join()
+
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(len(scanned), len(pkgbuilds))
+        self.assertTrue(all(digest for name, digest in scanned))
+
     def tearDown(self):
         shutil.rmtree(self.repos_path)
@@ -0,0 +1,65 @@
+import subprocess
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from django_pkgbuild.vcs import parse_source, probe_sources
+
+
+def git(*args, cwd):
+    return subprocess.run(['git', *args], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                          universal_newlines=True, check=True).stdout.strip()
+
+
+@override_settings(PKGBUILD={'probe_timeout': 10})
+class VcsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.remote = Path(self.tmp.name) / 'remote.git'
+        self.clone = Path(self.tmp.name) / 'clone'
+        git('init', '--bare', str(self.remote), cwd=self.tmp.name)
+        git('clone', str(self.remote), str(self.clone), cwd=self.tmp.name)
+        git('config', 'user.name', 'test', cwd=self.clone)
+        git('config', 'user.email', 'test@localhost', cwd=self.clone)
+
+    def commit(self):
+        git('commit', '--allow-empty', '-m', 'commit', cwd=self.clone)
+        git('push', 'origin', 'HEAD:master', cwd=self.clone)
+        return git('rev-parse', 'HEAD', cwd=self.clone)
+
+    def test_parse_source(self):
+        self.assertEqual(parse_source('test::git+https://example.org/test.git#branch=stable'),
+                         ('git', 'https://example.org/test.git', {'branch': 'stable'}))
+        self.assertEqual(parse_source('svn+https://example.org/svn/trunk'),
+                         ('svn', 'https://example.org/svn/trunk', {}))
+        self.assertEqual(parse_source('git://example.org/test.git'), ('git', 'git://example.org/test.git', {}))
+        self.assertIsNone(parse_source('https://example.org/test-1.0.tar.gz'))
+        self.assertIsNone(parse_source('test.patch'))
+
+    def test_probe_git(self):
+        first = self.commit()
+        git('symbolic-ref', 'HEAD', 'refs/heads/master', cwd=self.remote)
+        source = f'git+file://{self.remote}'
+
+        self.assertEqual(probe_sources([source, 'test.patch']), first)
+
+        second = self.commit()
+
+        self.assertEqual(probe_sources([source]), second)
+        self.assertEqual(probe_sources([f'{source}#branch=master']), second)
+        self.assertEqual(probe_sources([f'{source}#commit={first}']), first)
+
+    def test_probe_git_tag(self):
+        first = self.commit()
+        git('tag', '-a', 'v1', '-m', 'v1', cwd=self.clone)
+        git('push', 'origin', 'v1', cwd=self.clone)
+        self.commit()
+
+        self.assertEqual(probe_sources([f'git+file://{self.remote}#tag=v1']), first)
+
+    def test_probe_failure(self):
+        self.assertIsNone(probe_sources([f'git+file://{self.remote}-missing']))
+
+    def tearDown(self):
+        self.tmp.cleanup()
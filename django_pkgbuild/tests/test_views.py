@@ -0,0 +1,77 @@
+import os
+import shutil
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django_pkgbuild.models import Architecture, Package, Repository
+
+
+@override_settings(PKGBUILD={
+    'packages_root': os.getcwd() + '/django_pkgbuild/tests/packages',
+    'repositories_root': os.getcwd() + '/django_pkgbuild/tests/repositories',
+}, ROOT_URLCONF='django_pkgbuild.urls')
+class ViewsTestCase(TestCase):
+    fixtures = ['test-architectures', 'test-packages']
+
+    def setUp(self):
+        self.repos_path = Path(settings.PKGBUILD["repositories_root"])
+        if self.repos_path.exists():
+            shutil.rmtree(self.repos_path)
+        self.repos_path.mkdir(parents=True)
+
+        self.repo = Repository.objects.create(name='test', description='test', target=Repository.EXTRA)
+        self.repo.architectures.add(Architecture.objects.get(name='i686'))
+        self.repo.architectures.add(Architecture.objects.get(name='x86_64'))
+
+    def test_index_queries(self):
+        self.repo.packages.add(Package.objects.get(name='test-package'))
+        with CaptureQueriesContext(connection) as few_packages:
+            self.client.get('/')
+
+        self.repo.packages.add(*Package.objects.filter(virtual=False))
+        with CaptureQueriesContext(connection) as many_packages:
+            response = self.client.get('/')
+
+        self.assertContains(response, 'test-first-package')
+        self.assertEqual(len(few_packages), len(many_packages))
+
+    @mock.patch('django_pkgbuild.views.build_package_repo')
+    def test_rebuild(self, build_package_repo):
+        pkg = Package.objects.get(name='test-package')
+        self.repo.packages.add(pkg)
+        self.client.force_login(User.objects.create_user('test'))
+
+        self.assertContains(self.client.get('/'), 'name="rebuild"', count=2)
+
+        self.client.post('/build/', {'package_id': pkg.id, 'repository_id': self.repo.id, 'rebuild': '1'})
+        build_package_repo.assert_called_once_with(pkg, self.repo, True, True)
+
+    def test_api_packages(self):
+        self.repo.packages.add(Package.objects.get(name='test-depends-package'))
+
+        response = self.client.get('/api/packages/', {'repository': 'test', 'architecture': 'i686'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual({pkg['name'] for pkg in response.json()['results']},
+                         {'test-package', 'test-depends-package'})
+        self.assertEqual({pkg['status'] for pkg in response.json()['results']}, {'failed'})
+
+        response = self.client.get('/api/packages/', {'repository': 'test', 'architecture': 'i686'},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_api_pagination(self):
+        response = self.client.get('/api/repositories/', {'page': 2})
+
+        self.assertEqual(response.status_code, 404)
+
+    def tearDown(self):
+        shutil.rmtree(self.repos_path)
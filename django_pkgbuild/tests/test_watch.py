@@ -0,0 +1,60 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from django_pkgbuild.watch import InotifyWatcher, PollingWatcher, relevant
+
+
+class WatchTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / 'test-package').mkdir()
+
+    def test_relevant(self):
+        self.assertTrue(relevant(self.root / 'test-package' / 'PKGBUILD', self.root))
+        self.assertTrue(relevant(self.root / 'group' / 'test-package' / 'trunk' / 'PKGBUILD', self.root))
+        self.assertFalse(relevant(self.root / 'test-package' / '.SRCINFO', self.root))
+        self.assertFalse(relevant(self.root / '.git' / 'HEAD', self.root))
+        self.assertFalse(relevant(self.root / 'test-package' / 'src' / 'main.c', self.root))
+        self.assertFalse(relevant(self.root / 'test-package' / 'test-package-1.0-1-x86_64.pkg.tar.xz', self.root))
+
+    def test_inotify(self):
+        watcher = InotifyWatcher(self.root)
+        self.addCleanup(watcher.close)
+
+        (self.root / 'test-package' / 'PKGBUILD').write_text('pkgname=test-package\n')
+        (self.root / 'test-package' / '.SRCINFO').write_text('pkgname = test-package\n')
+        self.assertEqual(watcher.read(1), {self.root / 'test-package' / 'PKGBUILD'})
+
+        # New directories are watched too
+        (self.root / 'test-new-package').mkdir()
+        self.assertEqual(watcher.read(1), {self.root / 'test-new-package'})
+        (self.root / 'test-new-package' / 'PKGBUILD').write_text('pkgname=test-new-package\n')
+        self.assertEqual(watcher.read(1), {self.root / 'test-new-package' / 'PKGBUILD'})
+
+    def test_polling(self):
+        (self.root / 'test-package' / 'PKGBUILD').write_text('pkgname=test-package\n')
+        watcher = PollingWatcher(self.root, interval=0)
+
+        (self.root / 'test-package' / 'PKGBUILD').unlink()
+
+        self.assertEqual(watcher.read(0), {self.root / 'test-package' / 'PKGBUILD'})
+        self.assertEqual(watcher.read(0), set())
+
+    def test_polling_interval(self):
+        watcher = PollingWatcher(self.root, interval=60)
+
+        (self.root / 'test-package' / 'PKGBUILD').write_text('pkgname=test-package\n')
+
+        # Waiting for a burst to settle does not scan before the interval elapsed
+        with mock.patch.object(watcher, 'scan') as scan:
+            self.assertEqual(watcher.read(0), set())
+        scan.assert_not_called()
+        watcher.scanned -= 60
+        self.assertEqual(watcher.read(0), {self.root / 'test-package' / 'PKGBUILD'})
+
+    def tearDown(self):
+        self.tmp.cleanup()
@@ -12,4 +12,11 @@ urlpatterns = [
     url(r'^build_all/$', views.build_all, name='build_all'),
     url(r'^add/$', views.add, name='add'),
     url(r'^remove/$', views.remove, name='remove'),
+    url(r'^api/repositories/$', views.api_repositories, name='api_repositories'),
+    url(r'^api/packages/$', views.api_packages, name='api_packages'),
+    url(r'^api/builds/$', views.api_builds, name='api_builds'),
+    url(r'^api/building/$', views.api_building, name='api_building'),
+    url(r'^events/$', views.events_view, name='events'),
+    url(r'^builds/(?P<build_id>[0-9]+)/log/$', views.build_log_view, name='build_log'),
+    url(r'^metrics$', views.metrics_view, name='metrics'),
 ]
@@ -0,0 +1,110 @@
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .srcinfo import read_srcinfo
+
+VCS = ('bzr', 'git', 'hg', 'svn')
+
+
+def parse_source(source):
+    """Returns the VCS, URL and fragment of a VCS source, or None if it is not a VCS source."""
+    url = source.split('::', maxsplit=1)[-1]
+    url, _, fragment = url.partition('#')
+    scheme = url.split('://', maxsplit=1)[0]
+    vcs = scheme.split('+', maxsplit=1)[0]
+    if vcs not in VCS or '://' not in url:
+        return None
+    if '+' in scheme:
+        url = url[len(vcs) + 1:]
+    fragment = dict(item.split('=', maxsplit=1) for item in fragment.split('&') if '=' in item)
+    return vcs, url, fragment
+
+
+def run(cmd):
+    """Returns the output of a probe command, or None if it failed."""
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True,
+                              timeout=settings.PKGBUILD.get('probe_timeout', 60))
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if proc.returncode:
+        return None
+    return proc.stdout.strip() or None
+
+
+def probe_bzr(url, fragment):
+    """Returns the remote bazaar revision number."""
+    if 'revision' in fragment:
+        return run(['bzr', 'revno', '-r', fragment['revision'], url])
+    return run(['bzr', 'revno', url])
+
+
+def probe_git(url, fragment):
+    """Returns the remote git commit without fetching objects."""
+    if 'commit' in fragment:
+        return fragment['commit']
+    if 'tag' in fragment:
+        # Annotated tags are peeled to the commit they point to
+        output = run(['git', 'ls-remote', url, f'refs/tags/{fragment["tag"]}', f'refs/tags/{fragment["tag"]}^{{}}'])
+    elif 'branch' in fragment:
+        output = run(['git', 'ls-remote', url, f'refs/heads/{fragment["branch"]}'])
+    else:
+        output = run(['git', 'ls-remote', url, 'HEAD'])
+    if output is None:
+        return None
+    return output.splitlines()[-1].split()[0]
+
+
+def probe_hg(url, fragment):
+    """Returns the remote mercurial changeset id."""
+    revision = fragment.get('revision') or fragment.get('tag') or fragment.get('branch') or 'default'
+    return run(['hg', 'identify', '--id', '-r', revision, url])
+
+
+def probe_svn(url, fragment):
+    """Returns the remote subversion revision."""
+    if 'revision' in fragment:
+        return fragment['revision']
+    return run(['svn', 'info', '--show-item', 'last-changed-revision', url])
+
+
+PROBES = {
+    'bzr': probe_bzr,
+    'git': probe_git,
+    'hg': probe_hg,
+    'svn': probe_svn,
+}
+
+
+def probe_sources(sources):
+    """Returns the combined remote revisions of VCS sources, or None if there are none or a probe failed."""
+    revisions = []
+    for source in sources:
+        parsed = parse_source(source)
+        if parsed is None:
+            continue
+        vcs, url, fragment = parsed
+        revision = PROBES[vcs](url, fragment)
+        if revision is None:
+            return None
+        revisions.append(revision)
+    return ','.join(revisions) or None
+
+
+def probe(base_package):
+    """Returns the remote revision of a base package built from VCS sources."""
+    try:
+        srcinfo = read_srcinfo(base_package.directory())
+    except OSError:
+        return None
+    return probe_sources(srcinfo.matching('source'))
+
+
+def probe_packages(base_packages):
+    """Probes base packages concurrently and returns their remote revisions by id."""
+    base_packages = {base_pkg.id: base_pkg for base_pkg in base_packages}
+    with ThreadPoolExecutor(max_workers=settings.PKGBUILD.get('probe_workers', 8)) as executor:
+        revisions = executor.map(probe, base_packages.values())
+        return dict(zip(base_packages, revisions))
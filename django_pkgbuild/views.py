@@ -1,23 +1,21 @@
-from django.conf import settings
+import hashlib
+
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, redirect
-from django.views.decorators.http import require_POST
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Count, F, Max
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.views.decorators.http import condition, require_GET, require_POST
 
-from .models import Architecture, Package, Repository
-from .tasks import build_package_repo, build_packages_repo
+from . import events, metrics
+from .index import annotate_last_build, index_context
+from .models import Architecture, Build, Job, Package, Refresh, Repository
+from .tasks import build_package_repo, build_packages_repo, log_path
 
 
 def index(request):
-    repositories = Repository.objects.all()
-    architectures = Architecture.objects.exclude(name='any')
-    targets = Repository.TARGET_CHOICES
-    return render(request, 'index.html', {'repositories': repositories,
-                                          'architectures': architectures,
-                                          'targets': targets,
-                                          'sources_url': settings.PKGBUILD.get('sources_url', ''),
-                                          'bugs_url': settings.PKGBUILD.get('bugs_url', ''),
-                                          'static': settings.PKGBUILD.get('static', False)})
+    return render(request, 'index.html', index_context())
 
 
 @require_POST
@@ -70,7 +68,7 @@ def modify_repository(request):
 def build(request):
     pkg = Package.objects.get(id=request.POST['package_id'])
     repo = Repository.objects.get(id=request.POST['repository_id'])
-    build_package_repo(pkg, repo, True)
+    build_package_repo(pkg, repo, True, 'rebuild' in request.POST)
     return redirect('index')
 
 
@@ -78,7 +76,7 @@ def build(request):
 @login_required
 def build_all(request):
     repo = Repository.objects.get(id=request.POST['repository_id'])
-    build_packages_repo(repo, True)
+    build_packages_repo(repo, True, 'rebuild' in request.POST)
     return redirect('index')
 
 
@@ -98,3 +96,172 @@ def remove(request):
     repo = Repository.objects.get(id=request.POST['repository_id'])
     repo.packages.remove(pkg)
     return redirect('index')
+
+
+def api_state():
+    """Returns the time of the last change to the build state, and a digest of that state."""
+    jobs = Job.objects.aggregate(Max('updated'), Count('id'))
+    builds = Build.objects.aggregate(Max('id'), Count('id'))
+    refreshes = Refresh.objects.aggregate(Max('date'))
+    packages = Repository.packages.through.objects.aggregate(Max('id'), Count('id'))
+    last_modified = max(filter(None, [jobs['updated__max'], refreshes['date__max']]), default=None)
+    digest = hashlib.md5(repr((jobs, builds, refreshes, packages)).encode()).hexdigest()
+    return last_modified, digest
+
+
+def api_etag(request, *args, **kwargs):
+    return hashlib.md5(f'{api_state()[1]}{request.get_full_path()}'.encode()).hexdigest()
+
+
+def api_last_modified(request, *args, **kwargs):
+    return api_state()[0]
+
+
+def paginate(request, queryset, serialize):
+    """Returns a page of serialized objects, selected by the page and per_page parameters."""
+    try:
+        per_page = min(int(request.GET.get('per_page', 100)), 1000)
+        page = Paginator(queryset, per_page).page(request.GET.get('page', 1))
+    except (InvalidPage, ValueError):
+        raise Http404
+    return JsonResponse({'count': page.paginator.count,
+                         'page': page.number,
+                         'pages': page.paginator.num_pages,
+                         'results': [serialize(obj) for obj in page]})
+
+
+def package_status(package):
+    """Returns building, failed, outdated or built."""
+    if package.base_package.building:
+        return 'building'
+    if not package.base_package.builds:
+        return 'failed'
+    if package.last_build_version != package.base_package.version:
+        return 'outdated'
+    return 'built'
+
+
+@require_GET
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def api_repositories(request):
+    repositories = Repository.objects.prefetch_related('architectures').annotate(package_count=Count('packages'))
+    if 'architecture' in request.GET:
+        repositories = repositories.filter(architectures__name=request.GET['architecture'])
+    return paginate(request, repositories, lambda repo: {
+        'id': repo.id,
+        'name': repo.name,
+        'description': repo.description,
+        'target': repo.target,
+        'multilib': repo.multilib,
+        'architectures': [arch.name for arch in repo.architectures.all()],
+        'packages': repo.package_count,
+    })
+
+
+@require_GET
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def api_packages(request):
+    packages = annotate_last_build(Package.objects.filter(virtual=False))
+    if 'repository' in request.GET:
+        packages = packages.filter(repository__name=request.GET['repository'])
+    if 'architecture' in request.GET:
+        packages = packages.filter(base_package__architectures__name__in=[request.GET['architecture'], 'any'])
+    status = request.GET.get('status')
+    if status == 'building':
+        packages = packages.filter(base_package__building=True)
+    elif status == 'failed':
+        packages = packages.filter(base_package__building=False, base_package__builds=False)
+    elif status == 'outdated':
+        packages = packages.filter(base_package__building=False, base_package__builds=True) \
+            .exclude(last_build_version=F('base_package__version'))
+    elif status == 'built':
+        packages = packages.filter(base_package__building=False, base_package__builds=True,
+                                   last_build_version=F('base_package__version'))
+    return paginate(request, packages.distinct(), lambda pkg: {
+        'id': pkg.id,
+        'name': pkg.name,
+        'base_package': pkg.base_package.name,
+        'version': pkg.base_package.version,
+        'status': package_status(pkg),
+        'last_build_version': pkg.last_build_version,
+        'last_build_date': pkg.last_build_date,
+    })
+
+
+@require_GET
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def api_builds(request):
+    builds = Build.objects.select_related('base_package', 'architecture').prefetch_related('phases').order_by('-id')
+    if 'package' in request.GET:
+        builds = builds.filter(base_package__packages__name=request.GET['package'])
+    if 'repository' in request.GET:
+        builds = builds.filter(base_package__packages__repository__name=request.GET['repository'])
+    if 'architecture' in request.GET:
+        builds = builds.filter(architecture__name=request.GET['architecture'])
+    return paginate(request, builds.distinct(), lambda build: {
+        'id': build.id,
+        'base_package': build.base_package.name,
+        'version': build.version,
+        'architecture': build.architecture.name,
+        'target': build.target,
+        'status': build.status,
+        'started': build.started,
+        'finished': build.finished,
+        'duration': build.duration(),
+        'phases': {phase.name: phase.duration for phase in build.phases.all()},
+    })
+
+
+@require_GET
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def api_building(request):
+    jobs = Job.objects.filter(state__in=[Job.READY, Job.QUEUED, Job.BUILDING]) \
+        .select_related('package__base_package', 'architecture', 'repository').order_by('id')
+    if 'repository' in request.GET:
+        jobs = jobs.filter(repository__name=request.GET['repository'])
+    if 'architecture' in request.GET:
+        jobs = jobs.filter(architecture__name=request.GET['architecture'])
+    if 'status' in request.GET:
+        jobs = jobs.filter(state=request.GET['status'])
+    return paginate(request, jobs, lambda job: {
+        'id': job.id,
+        'batch': job.batch_id,
+        'package': job.package.name,
+        'version': job.package.base_package.version,
+        'architecture': job.architecture.name,
+        'repository': job.repository.name,
+        'status': job.state,
+        'updated': job.updated,
+    })
+
+
+def event_position(request, parameter):
+    """Returns where a stream starts, resuming from the last event a reconnecting browser received."""
+    try:
+        return int(request.META.get('HTTP_LAST_EVENT_ID', request.GET.get(parameter, 0)))
+    except ValueError:
+        raise Http404
+
+
+def event_stream(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def events_view(request):
+    return event_stream(events.stream(event_position(request, 'since')))
+
+
+@require_GET
+def build_log_view(request, build_id):
+    build = get_object_or_404(Build.objects.select_related('base_package', 'architecture'), id=build_id)
+    return event_stream(events.tail(build.id, log_path(build), event_position(request, 'offset')))
+
+
+@require_GET
+def metrics_view(request):
+    return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
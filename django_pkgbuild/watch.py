@@ -0,0 +1,150 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR = 0x40000000
+MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT = struct.Struct('iIII')
+# PKGBUILDs are found up to a depth of 2, official ones have one more level for trunk
+DEPTH = 3
+# Written by builds and refreshes, and never part of a PKGBUILD
+IGNORED_DIRECTORIES = ('src', 'pkg')
+IGNORED_SUFFIXES = ('.pkg.tar.xz', '.sig', '.log')
+
+
+def relevant(path, root):
+    """Returns True if a change to path may change a PKGBUILD."""
+    parts = Path(path).relative_to(root).parts
+    if not parts or len(parts) > DEPTH + 1:
+        return False
+    if any(part.startswith('.') or part in IGNORED_DIRECTORIES for part in parts):
+        return False
+    return not parts[-1].endswith(IGNORED_SUFFIXES)
+
+
+def walk(root):
+    """Yields the directories of root which may hold PKGBUILDs, and their depth."""
+    stack = [(Path(root), 0)]
+    while stack:
+        directory, depth = stack.pop()
+        yield directory, depth
+        if depth == DEPTH:
+            continue
+        try:
+            for entry in os.scandir(directory):
+                if entry.is_dir(follow_symlinks=False) and relevant(entry.path, root):
+                    stack.append((Path(entry.path), depth + 1))
+        except OSError:
+            continue
+
+
+class InotifyWatcher:
+    """Watches the directories of a PKGBUILD tree with inotify."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}
+        for directory, depth in walk(self.root):
+            self.add_watch(directory, depth)
+
+    def add_watch(self, directory, depth):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), MASK)
+        if wd >= 0:
+            self.watches[wd] = (directory, depth)
+
+    def read(self, timeout):
+        """Returns the paths changed within timeout seconds, possibly none."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            name = data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b'\0')
+            offset += EVENT.size + length
+            if wd not in self.watches:
+                continue
+            directory, depth = self.watches[wd]
+            if mask & IN_DELETE_SELF:
+                del self.watches[wd]
+                paths.add(directory)
+                continue
+            path = directory / os.fsdecode(name)
+            if not relevant(path, self.root):
+                continue
+            paths.add(path)
+            # Watch new package directories, along with what was moved into them
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and depth < DEPTH:
+                for subdirectory, subdepth in walk(path):
+                    if depth + 1 + subdepth <= DEPTH:
+                        self.add_watch(subdirectory, depth + 1 + subdepth)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Compares the modification times of a PKGBUILD tree, for filesystems without inotify."""
+
+    def __init__(self, root, interval=30):
+        self.root = Path(root)
+        self.interval = interval
+        self.mtimes = self.scan()
+        self.scanned = time.monotonic()
+
+    def scan(self):
+        mtimes = {}
+        for directory, depth in walk(self.root):
+            try:
+                for entry in os.scandir(directory):
+                    if entry.is_file(follow_symlinks=False) and relevant(entry.path, self.root):
+                        mtimes[entry.path] = entry.stat().st_mtime
+            except OSError:
+                continue
+        return mtimes
+
+    def read(self, timeout):
+        """Returns the paths changed since the last scan, scanning at most once per interval."""
+        wait = self.scanned + self.interval - time.monotonic()
+        if timeout is not None and timeout < wait:
+            # Too early to scan, the changes are left to the next scan
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        mtimes = self.scan()
+        self.scanned = time.monotonic()
+        paths = {Path(path) for path in mtimes.keys() ^ self.mtimes.keys()}
+        paths.update(Path(path) for path, mtime in mtimes.items() if self.mtimes.get(path, mtime) != mtime)
+        self.mtimes = mtimes
+        return paths
+
+    def close(self):
+        pass
+
+
+def watch(watcher, callback, settle=2):
+    """Call callback with the paths changed by each burst of changes, once nothing changed for settle seconds."""
+    pending = set()
+    while True:
+        paths = watcher.read(settle if pending else None)
+        if paths:
+            pending.update(paths)
+        elif pending:
+            callback(pending)
+            pending = set()